@@ -0,0 +1,80 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import time: self [us] | cumulative | imported package
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def measure(module: str):
+    # a fresh interpreter every time, otherwise everything is already in sys.modules
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                          stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=True)
+
+    modules = {}
+    total = 0
+
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+
+        own, cumulative, indent, name = match.groups()
+        modules[name] = int(own)
+
+        if name == module:
+            total = int(cumulative)
+
+    return total, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold start time of the evaluator package.')
+    parser.add_argument('module', nargs='?', default='src.evaluator')
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('-t', '--top', type=int, default=10, help='number of the slowest modules to show')
+    parser.add_argument('--max-ms', type=float, help='fail if the median time is above this')
+    parser.add_argument('--forbid', action='append', default=['PySide6', 'multiprocessing', 'inspect'],
+                        help='module that must not be imported, can be repeated')
+    args = parser.parse_args(argv)
+
+    totals = []
+    own = {}
+
+    for _ in range(args.runs):
+        total, modules = measure(args.module)
+        totals.append(total)
+
+        for name, value in modules.items():
+            own.setdefault(name, []).append(value)
+
+    median = statistics.median(totals) / 1000
+
+    print(f'import {args.module}: min {min(totals) / 1000:.1f} ms, median {median:.1f} ms ({args.runs} runs)')
+    print()
+
+    slowest = sorted(own.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:args.top]
+    for name, values in slowest:
+        print(f'{statistics.median(values) / 1000:8.2f} ms  {name}')
+
+    status = 0
+
+    for name in args.forbid:
+        if name in own:
+            print(f'\n{name} is imported by {args.module}')
+            status = 1
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f'\nmedian {median:.1f} ms is above {args.max_ms:.1f} ms')
+        status = 1
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
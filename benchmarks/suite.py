@@ -0,0 +1,203 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.evaluator import Lexer, Tokenizer, Converter, Evaluator, EasyWrapper, solve_using_secant, \
+    integral_using_simpson
+
+CORPUS = {
+    'small': ['x+1', '2*x-3', 'x^2', '-x/4', '1,5*x+2,5'],
+    'nested': ['(' * 30 + 'x' + '+1)' * 30, '((((x+1)*(x-1))^2-((x+2)/(x-2)))*(((x*3)-1)/((x*x)+1)))'],
+    'functions': ['sin(cos(tan(x)))', 'sqrt(exp(x)+log(x+2))*atan(x)', 'cosh(sinh(erf(x)))+lg(x^2+1)'],
+    'long': ['+'.join(f'{i}*x^{i % 5}' for i in range(1, 80)), '*'.join(['(x+1)'] * 60)]
+}
+
+# the solvers evaluate an expression thousands of times, so they get short expressions with a root on [0, 3]
+SOLVER_CORPUS = {
+    'small': ['x^2-2', 'x^3-x-1', 'x^2-x-1'],
+    'functions': ['sin(x)-0,5', 'atan(x)-1']
+}
+
+STAGES = ['lexer', 'tokenizer', 'converter', 'evaluator', 'secant', 'simpson']
+SOLVERS = ['secant', 'simpson']
+
+
+def prepare(stage: str, source: str) -> Tuple[Callable, object]:
+    # only the measured stage runs in the benchmark, its input is built beforehand
+    lexer = Lexer()
+    tokenizer = Tokenizer()
+    converter = Converter()
+    evaluator = Evaluator()
+
+    if stage == 'lexer':
+        return lexer.parse, source
+
+    lexer_result = lexer.parse(source)
+    if stage == 'tokenizer':
+        return tokenizer.tokenize, lexer_result
+
+    tokenizer_result = tokenizer.tokenize(lexer_result)
+    if stage == 'converter':
+        return converter.convert, tokenizer_result
+
+    if stage == 'evaluator':
+        converter_result = converter.convert(tokenizer_result)
+        return lambda x: evaluator.eval(converter_result, x), 0.5
+
+    wrapper = EasyWrapper(source)
+    if stage == 'secant':
+        return lambda expr: solve_using_secant(expr, 0, 3), wrapper
+
+    return lambda expr: integral_using_simpson(expr, 0, 3), wrapper
+
+
+def measure_time(func: Callable, arg, min_time: float, repeat: int):
+    timer = timeit.Timer(lambda: func(arg))
+
+    # like timeit's autorange, but with a configurable minimal duration
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 10 > min_time else 10
+
+    return min(timer.repeat(repeat, number)) / number
+
+
+def measure_allocations(func: Callable, arg):
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        # the second call is measured, so that lazily built tables and caches aren't counted
+        func(arg)
+
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        result = func(arg)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del result
+
+    # peak memory used during the call and memory held by its result, bytes
+    return peak - before, after - before
+
+
+def run(stages: List[str], groups: List[str], min_time: float, repeat: int) -> Dict[str, dict]:
+    results = {}
+
+    for stage in stages:
+        corpus = SOLVER_CORPUS if stage in SOLVERS else CORPUS
+
+        for group in groups:
+            if group not in corpus:
+                continue
+
+            total = 0
+            peak = 0
+            retained = 0
+
+            for source in corpus[group]:
+                func, arg = prepare(stage, source)
+
+                total += measure_time(func, arg, min_time, repeat)
+
+                source_peak, source_retained = measure_allocations(func, arg)
+                peak = max(peak, source_peak)
+                retained += source_retained
+
+            count = len(corpus[group])
+            results[f'{stage}/{group}'] = {
+                'seconds': total / count,
+                'ops': count / total,
+                'peak_bytes': peak,
+                'retained_bytes': retained / count
+            }
+
+            print(format_result(f'{stage}/{group}', results[f'{stage}/{group}']), flush=True)
+
+    return results
+
+
+def format_result(name: str, result: dict):
+    return f'{name:24} {result["seconds"] * 1e6:12.2f} us {result["ops"]:12.0f} ops/s ' \
+           f'{result["peak_bytes"] / 1024:10.1f} KiB peak {result["retained_bytes"] / 1024:8.1f} KiB retained'
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float):
+    regressions = []
+
+    print(f'\n{"benchmark":24} {"baseline":>12} {"current":>12} {"change":>8}')
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        old = baseline[name]['seconds']
+        new = result['seconds']
+        change = new / old - 1
+
+        mark = ''
+        if change > threshold:
+            mark = '  slower'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = '  faster'
+
+        print(f'{name:24} {old * 1e6:9.2f} us {new * 1e6:9.2f} us {change:+8.1%}{mark}')
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the evaluator stages.')
+    parser.add_argument('-s', '--stage', action='append', choices=STAGES, help='stage to run, can be repeated')
+    parser.add_argument('-g', '--group', action='append', choices=list(CORPUS), help='corpus group, can be repeated')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal duration of one measurement, seconds')
+    parser.add_argument('--repeat', type=int, default=5, help='measurements per benchmark, the best one is used')
+    parser.add_argument('--save', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as a regression')
+    parser.add_argument('-v', '--verbose', action='store_true', help="don't silence the evaluator logs")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        # failed evaluations are logged, which would flood the output and the timings
+        logging.disable(logging.CRITICAL)
+
+    results = run(args.stage or STAGES, args.group or list(CORPUS), args.min_time, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        if baseline.get('python') != platform.python_version():
+            print(f'\nbaseline is from Python {baseline.get("python")}, the numbers may not be comparable')
+
+        if compare(results, baseline['results'], args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,9 @@ import sys
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import QApplication
 
-from src import MathWindow
+from src import MathWindow, setup_logging
+
+setup_logging()
 
 app = QApplication()
 font = QFont('Montserrat', 14)
@@ -1,2 +1,18 @@
 from .evaluator import *
-from .gui import *
+from .evaluator import _AIO_NAMES
+
+# the GUI drags in Qt, so it's only imported when actually used
+_GUI_NAMES = ('MathWindow',)
+
+
+def __getattr__(name):
+    if name in _GUI_NAMES:
+        from . import gui
+
+        return getattr(gui, name)
+    if name in _AIO_NAMES:
+        from .evaluator import aio
+
+        return getattr(aio, name)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
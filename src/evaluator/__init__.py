@@ -1,51 +1,31 @@
-import logging
-import sys
-
-format = ' {name:10} {asctime}   {levelname:10} | {message}'
-datefmt = '%I:%M:%S %p'
-padding = ' ' * (format.index('|') + 1)
-
-
-class ColoredFormatter(logging.Formatter):
-    debug_color = '\033[36m'
-    info_color = '\033[32m'
-    warning_color = '\033[33m'
-    error_color = '\033[31m'
-    critical_color = '\033[31m' + '\033[1m'
-
-    reset = "\x1b[0m"
-
-    FORMATS = {
-        logging.DEBUG: debug_color + format + reset,
-        logging.INFO: info_color + format + reset,
-        logging.WARNING: warning_color + format + reset,
-        logging.ERROR: error_color + format + reset,
-        logging.CRITICAL: critical_color + format + reset
-    }
-    FORMATTERS = {k: logging.Formatter(v, datefmt, '{') for k, v in FORMATS.items()}
-
-    def format(self, record):
-        formatter = self.FORMATTERS.get(record.levelno)
-        return formatter.format(record)
-
-
-colored_formatter = ColoredFormatter(style='{')
-
-
-def create_console_handler():
-    console_logger = logging.StreamHandler(sys.stdout)
-    console_logger.setLevel(logging.INFO)
-    console_logger.setFormatter(colored_formatter)
-
-    return console_logger
-
-
-logging.basicConfig(format=format, datefmt=datefmt, style='{', level=logging.INFO, handlers=[create_console_handler()])
-
+from .logs import ColoredFormatter, colored_formatter, create_console_handler, setup_logging, silenced
+from .tracing import get_trace_hook, set_trace_hook, log_trace_hook, TraceRecorder
+from .cancellation import CancellationToken
+from .metrics import get_metrics_sink, set_metrics_sink, MetricsRecorder
 from .lexer import Lexer
+from .fast_lexer import FastLexer, IncrementalLexer
 from .tokenizer import Tokenizer, Token
 from .converter import Converter
+from .program import Program
 from .evaluator import Evaluator
+from .optimizer import Optimizer
+from .derivative import Differentiator
+from .wrapper import EasyWrapper, evaluate_batch
+from .library import save_library, ProgramLibrary
+from .streaming import stream_eval, stream_text_file, stream_binary_file, write_text, write_binary
+from .cache import LRUCache, BoundedCache, POLICY_LRU, POLICY_FIFO
 from .solvers import *
 from .consts import *
 from .exceptions import *
+
+# asyncio is slow to import, so the async API is only loaded when used
+_AIO_NAMES = ('async_integrate', 'async_solve', 'async_eval_many')
+
+
+def __getattr__(name):
+    if name in _AIO_NAMES:
+        from . import aio
+
+        return getattr(aio, name)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,144 @@
+import asyncio
+import math
+import time
+import weakref
+from array import array
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from typing import Callable, Iterable
+
+from .cancellation import CancellationToken
+from .metrics import get_metrics_sink
+from .solvers import N, STATUS_CONVERGED, STATUS_CANCELLED, SolverResult, solve_using_secant, _simpson_chunk
+from .streaming import iter_chunks
+from .wrapper import EasyWrapper
+
+# the work runs in an executor, a thread pool by default (wrappers are shared with the threads, not pickled),
+# and is split in chunks, so a long job gives the event loop back between them and can be dropped in the middle
+# sub-intervals of the integral per executor call
+INTEGRAL_CHUNK = 2500
+# values per executor call in async_eval_many
+EVAL_CHUNK = 1 << 14
+# jobs running at once in an event loop unless a semaphore is given, the others wait for a free slot
+MAX_JOBS = 8
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _default_semaphore():
+    # asyncio primitives belong to one loop, so there is one default semaphore per loop
+    loop = asyncio.get_running_loop()
+
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(MAX_JOBS)
+
+    return semaphore
+
+
+@asynccontextmanager
+async def _slot(semaphore: asyncio.Semaphore, sink):
+    started = time.perf_counter()
+
+    async with semaphore or _default_semaphore():
+        if sink is not None:
+            sink('aio.queued.seconds', time.perf_counter() - started)
+
+        yield
+
+
+def _report(sink, name: str, started: float, res: SolverResult):
+    if sink is not None:
+        sink(f'{name}.seconds', time.perf_counter() - started)
+        sink(f'{name}.evaluations', res.evaluations)
+        sink(f'{name}.iterations', res.iterations)
+
+
+async def async_integrate(expr: EasyWrapper, a: float, b: float, callback: Callable = None,
+                          token: CancellationToken = None, executor: Executor = None,
+                          semaphore: asyncio.Semaphore = None, chunk: int = INTEGRAL_CHUNK):
+    # the fixed-step rule of integral_using_simpson, the callback is called from the event loop
+    loop = asyncio.get_running_loop()
+    sink = get_metrics_sink()
+    dx = (b - a) / N
+
+    async with _slot(semaphore, sink):
+        started = time.perf_counter()
+
+        values = []
+        evaluations = 0
+        done = 0
+        status = STATUS_CONVERGED
+
+        for start in range(0, N, chunk):
+            if token is not None and token.cancelled:
+                status = STATUS_CANCELLED
+                break
+
+            if callback is not None:
+                callback(start, N)
+
+            stop = min(start + chunk, N)
+            value, count = await loop.run_in_executor(executor, _simpson_chunk, expr, a, dx, start, stop)
+
+            values.append(value)
+            evaluations += count
+            done = stop
+
+        # summed in the chunk order, the integral over [a, a + done * dx] is the partial result
+        res = SolverResult(math.fsum(values), status, evaluations, done)
+
+    _report(sink, 'async_integrate', started, res)
+
+    return res
+
+
+async def async_solve(expr: EasyWrapper, a: float, b: float, solver: Callable = solve_using_secant,
+                      token: CancellationToken = None, executor: Executor = None,
+                      semaphore: asyncio.Semaphore = None):
+    # the iterations depend on each other, so the solver runs as one executor call and a cancelled task
+    # stops it through the token, which it checks on every step
+    loop = asyncio.get_running_loop()
+    token = token or CancellationToken()
+
+    async with _slot(semaphore, get_metrics_sink()):
+        future = loop.run_in_executor(executor, lambda: solver(expr, a, b, token=token))
+
+        try:
+            # shielded, so the slot is only released once the solver has really stopped
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            token.cancel()
+            await asyncio.wait([future])
+            raise
+
+
+async def async_eval_many(expr: EasyWrapper, xs: Iterable[float], executor: Executor = None,
+                          semaphore: asyncio.Semaphore = None, chunk: int = EVAL_CHUNK):
+    # the same result as expr.eval_many(xs)
+    loop = asyncio.get_running_loop()
+    sink = get_metrics_sink()
+
+    async with _slot(semaphore, sink):
+        started = time.perf_counter()
+        parts = [await loop.run_in_executor(executor, expr.eval_many, part) for part in iter_chunks(xs, chunk)]
+
+    if sink is not None:
+        sink('async_eval_many.seconds', time.perf_counter() - started)
+        sink('async_eval_many.evaluations', sum(len(part) for part in parts))
+
+    if not parts:
+        return expr.eval_many(())
+    if len(parts) == 1:
+        return parts[0]
+    if isinstance(parts[0], array):
+        # no numpy
+        res = parts[0]
+        for part in parts[1:]:
+            res.extend(part)
+
+        return res
+
+    import numpy as np
+
+    return np.concatenate(parts)
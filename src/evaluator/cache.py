@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+POLICY_LRU = 'lru'
+POLICY_FIFO = 'fifo'
+
+
+class BoundedCache:
+    def __init__(self, maxsize: int = 4096, policy: str = POLICY_LRU):
+        assert maxsize > 0
+        assert policy in (POLICY_LRU, POLICY_FIFO)
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if self.policy == POLICY_LRU:
+                self._data.move_to_end(key)
+
+            self.hits += 1
+
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+            if self.policy == POLICY_LRU:
+                self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __repr__(self):
+        return f'{type(self).__name__}(policy={self.policy}, hits={self.hits}, misses={self.misses}, ' \
+               f'maxsize={self.maxsize}, currsize={len(self._data)})'
+
+
+class LRUCache(BoundedCache):
+    def __init__(self, maxsize: int = 4096):
+        super().__init__(maxsize, POLICY_LRU)
@@ -0,0 +1,34 @@
+import time
+
+
+# checked by the solvers between steps, cancel() may be called from any thread
+class CancellationToken:
+    def __init__(self, timeout: float = None, deadline: float = None):
+        # deadline is a time.monotonic() value, timeout is relative to now, the earlier one wins
+        if timeout is not None:
+            deadline = min(deadline, time.monotonic() + timeout) if deadline is not None else \
+                time.monotonic() + timeout
+
+        self.deadline = deadline
+
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled or self.expired
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+
+        return max(0.0, self.deadline - time.monotonic())
+
+    def __repr__(self):
+        return f'CancellationToken(cancelled={self._cancelled}, expired={self.expired}, remaining={self.remaining()})'
@@ -0,0 +1,280 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import sys
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterable
+
+from .library import ProgramLibrary, save_library
+from .logs import setup_logging, silenced
+from .metrics import MetricsRecorder, set_metrics_sink
+from .cancellation import CancellationToken
+from .solvers import solve_using_secant, solve_using_brent, solve_using_newton, find_all_roots, \
+    integral_using_simpson_batched, integral_using_adaptive_simpson, STATUS_CONVERGED, STATUS_CANCELLED
+from .tracing import set_trace_hook, log_trace_hook
+from .wrapper import EasyWrapper
+
+FIELDS = {
+    'eval': ['expression', 'x', 'value', 'error'],
+    'root': ['expression', 'root', 'error'],
+    'integrate': ['expression', 'value', 'error']
+}
+
+# a formula can be valid and still fail for some x (10^400, (-8)^(1/3)), that is reported and the batch goes on
+EVALUATION_ERRORS = (ArithmeticError, TypeError, ValueError)
+
+# libraries opened by this process, a worker maps the file once and reuses it for every expression
+_libraries = {}
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(prog='python -m src.evaluator',
+                                     description='Evaluate expressions, find roots and calculate integrals.')
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('expressions', nargs='*', metavar='EXPRESSION',
+                        help='expressions to process, read from stdin (or an interactive prompt) if omitted')
+    common.add_argument('-f', '--file', help='file with one expression per line, "-" for stdin')
+    common.add_argument('--format', choices=['json', 'csv'], default='json', help='output format')
+    common.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    common.add_argument('-v', '--verbose', action='count', default=0, help='log more, twice to trace every step')
+    common.add_argument('--metrics', action='store_true',
+                        help='print where the time went to stderr (only for the work done in this process)')
+    common.add_argument('-l', '--library', help='precompiled expressions made by the "compile" command')
+
+    interval = argparse.ArgumentParser(add_help=False)
+    interval.add_argument('-a', type=float, default=-10, help='start of the interval')
+    interval.add_argument('-b', type=float, default=10, help='end of the interval')
+    interval.add_argument('-t', '--timeout', type=float, help='seconds per expression, partial results are reported')
+
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_eval = commands.add_parser('eval', parents=[common], help='evaluate expressions')
+    parser_eval.add_argument('-x', type=float, action='append', help='value of x, can be repeated (default: 0)')
+
+    parser_root = commands.add_parser('root', parents=[common, interval], help='find roots on [a, b]')
+    parser_root.add_argument('--method', choices=['all', 'brent', 'newton', 'halley', 'secant'], default='all')
+
+    parser_integrate = commands.add_parser('integrate', parents=[common, interval], help='integrate on [a, b]')
+    parser_integrate.add_argument('--method', choices=['simpson', 'adaptive'], default='simpson')
+
+    parser_compile = commands.add_parser('compile', parents=[common], help='precompile expressions into a library')
+    parser_compile.add_argument('-o', '--output', required=True, help='library file to write')
+
+    return parser
+
+
+def get_wrapper(source: str, library: str = None):
+    if library is None:
+        return EasyWrapper.from_string(source)
+
+    if library not in _libraries:
+        _libraries[library] = ProgramLibrary(library)
+
+    return _libraries[library].get_wrapper(source)
+
+
+def process(command: str, source: str, options: dict) -> List[dict]:
+    # top-level function, so it can run in a worker process
+    wrapper = get_wrapper(source, options.get('library'))
+    if not wrapper.valid:
+        return [{'expression': source, 'error': str(wrapper.err)}]
+
+    if command == 'eval':
+        return [_evaluate(source, wrapper, x) for x in options['xs']]
+
+    try:
+        return _solve(command, source, wrapper, options)
+    except EVALUATION_ERRORS as err:
+        return [{'expression': source, 'root' if command == 'root' else 'value': None, 'error': str(err)}]
+
+
+def _evaluate(source: str, wrapper: EasyWrapper, x: float) -> dict:
+    try:
+        return {'expression': source, 'x': x, 'value': wrapper(x)}
+    except EVALUATION_ERRORS as err:
+        return {'expression': source, 'x': x, 'value': None, 'error': str(err)}
+
+
+def _solve(command: str, source: str, wrapper: EasyWrapper, options: dict) -> List[dict]:
+    a, b = options['a'], options['b']
+
+    # the timeout is per expression, a timed out solver still reports what it has found so far
+    token = CancellationToken(options['timeout']) if options.get('timeout') is not None else None
+    error = {}
+
+    if command == 'root':
+        if options['method'] == 'all':
+            res = find_all_roots(wrapper, a, b, token=token)
+            roots = res.value
+        elif options['method'] == 'brent':
+            res = solve_using_brent(wrapper, a, b, token=token)
+            roots = [res.value]
+        elif options['method'] in ('newton', 'halley'):
+            res = solve_using_newton(wrapper, a, b, options['method'] == 'halley', token=token)
+            roots = [res.value if res.status == STATUS_CONVERGED else None]
+        else:
+            res = solve_using_secant(wrapper, a, b, token=token)
+            # the last approximation of an unfinished secant search is no root
+            roots = [res.value if res.status == STATUS_CONVERGED else None]
+
+        if res.status == STATUS_CANCELLED:
+            error = {'error': 'timed out'}
+
+        return [{'expression': source, 'root': root, **error} for root in roots if root is not None] or \
+               [{'expression': source, 'root': None, **error}]
+
+    if options['method'] == 'adaptive':
+        res = integral_using_adaptive_simpson(wrapper, a, b, token=token)
+        error = {'error': res.error}
+    else:
+        res = integral_using_simpson_batched(wrapper, a, b, token=token)
+
+    if res.status == STATUS_CANCELLED:
+        error = {'error': 'timed out'}
+
+    return [{'expression': source, 'value': res.value, **error}]
+
+
+def _process_args(args):
+    return process(*args)
+
+
+def read_expressions(args) -> Iterable[str]:
+    # blank expressions are skipped wherever they come from, the lexer has nothing to report for them
+    for expression in args.expressions or ():
+        if expression.strip():
+            yield expression
+
+    if args.file:
+        file = sys.stdin if args.file == '-' else open(args.file)
+
+        try:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if file is not sys.stdin:
+                file.close()
+    elif not args.expressions:
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                yield line
+
+
+class Writer:
+    def __init__(self, command: str, format: str, out=None):
+        self.format = format
+        self.out = out or sys.stdout
+        self.first = True
+
+        self._csv = csv.DictWriter(self.out, FIELDS[command], extrasaction='ignore') if format == 'csv' else None
+
+    def write(self, records: List[dict]):
+        for record in records:
+            if self._csv is not None:
+                if self.first:
+                    self._csv.writeheader()
+                self._csv.writerow(record)
+            else:
+                self.out.write('[\n' if self.first else ',\n')
+                # NaN and Infinity (the error of a diverging integral) aren't JSON
+                record = {key: None if isinstance(value, float) and not math.isfinite(value) else value
+                          for key, value in record.items()}
+                self.out.write(json.dumps(record, allow_nan=False))
+
+            self.first = False
+
+        self.out.flush()
+
+    def close(self):
+        if self._csv is None:
+            self.out.write('[]\n' if self.first else '\n]\n')
+
+
+def repl(command: str, options: dict, writer: Writer):
+    while True:
+        try:
+            line = input('> ').strip()
+        except EOFError:
+            break
+
+        if line:
+            writer.write(process(command, line, options))
+
+            if writer.format == 'json':
+                # every answer is a complete document in the interactive mode
+                writer.close()
+                writer.first = True
+
+
+def main(argv: List[str] = None):
+    args = create_parser().parse_args(argv)
+
+    if args.verbose:
+        setup_logging(logging.DEBUG if args.verbose > 1 else logging.INFO)
+        if args.verbose > 1:
+            set_trace_hook(log_trace_hook)
+
+    # errors are reported in the output itself
+    with nullcontext() if args.verbose else silenced():
+        return _main(args)
+
+
+def _main(args):
+    options = {
+        'xs': (args.x or [0]) if args.command == 'eval' else None,
+        'a': getattr(args, 'a', None),
+        'b': getattr(args, 'b', None),
+        'method': getattr(args, 'method', None),
+        'timeout': getattr(args, 'timeout', None),
+        'library': args.library
+    }
+
+    if args.command == 'compile':
+        count = save_library(args.output, read_expressions(args))
+        print(f'{count} expressions saved to {args.output}', file=sys.stderr)
+
+        return 0
+
+    writer = Writer(args.command, args.format)
+
+    recorder = None
+    if args.metrics:
+        recorder = MetricsRecorder()
+        set_metrics_sink(recorder)
+
+    try:
+        run(args, options, writer)
+    finally:
+        if recorder is not None:
+            set_metrics_sink(None)
+            print(recorder.summary(), file=sys.stderr)
+
+    return 0
+
+
+def run(args, options: dict, writer: Writer):
+    if not args.expressions and not args.file and sys.stdin.isatty():
+        repl(args.command, options, writer)
+        return
+
+    expressions = read_expressions(args)
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            # map() keeps the input order
+            results = executor.map(_process_args, ((args.command, source, options) for source in expressions),
+                                   chunksize=16)
+            for records in results:
+                writer.write(records)
+    else:
+        for source in expressions:
+            writer.write(process(args.command, source, options))
+
+    writer.close()
@@ -1,7 +1,7 @@
 import math
 import string
-
-from inspect import isbuiltin, getmembers
+from collections.abc import MutableMapping
+from types import BuiltinFunctionType
 
 #
 # Operators
@@ -38,11 +38,52 @@ ALPHABET = string.ascii_letters + '_'
 # Various
 #
 
-FUNCTIONS = {item[0]: item[1] for item in getmembers(math, isbuiltin)}
-# giga-brain move
-FUNCTIONS.update({f'co{item[0]}': lambda x, f=FUNCTIONS[item[0]]: 1.0 / f(x) for item in FUNCTIONS.items()})
-FUNCTIONS['ln'] = math.log
-FUNCTIONS['lb'] = math.log2
-FUNCTIONS['lg'] = math.log10
-FUNCTIONS['log_two'] = math.log2
-FUNCTIONS['log_ten'] = math.log10
+def _build_functions():
+    functions = {name: item for name, item in vars(math).items()
+                 if isinstance(item, BuiltinFunctionType) and not name.startswith('_')}
+    # giga-brain move
+    functions.update({f'co{name}': lambda x, f=func: 1.0 / f(x) for name, func in functions.items()})
+    functions['ln'] = math.log
+    functions['lb'] = math.log2
+    functions['lg'] = math.log10
+    functions['log_two'] = math.log2
+    functions['log_ten'] = math.log10
+
+    return functions
+
+
+class FunctionTable(MutableMapping):
+    # a dict built on first use, so importing the package doesn't pay for it
+    def __init__(self, builder):
+        self._builder = builder
+        self._table = None
+
+    def _load(self):
+        if self._table is None:
+            self._table = self._builder()
+
+        return self._table
+
+    def __getitem__(self, key):
+        return (self._table or self._load())[key]
+
+    def __setitem__(self, key, value):
+        (self._table or self._load())[key] = value
+
+    def __delitem__(self, key):
+        del (self._table or self._load())[key]
+
+    def __contains__(self, key):
+        return key in (self._table or self._load())
+
+    def __iter__(self):
+        return iter(self._table or self._load())
+
+    def __len__(self):
+        return len(self._table or self._load())
+
+    def get(self, key, default=None):
+        return (self._table or self._load()).get(key, default)
+
+
+FUNCTIONS = FunctionTable(_build_functions)
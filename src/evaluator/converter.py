@@ -2,17 +2,42 @@ import logging
 from typing import Tuple, List
 
 from .consts import *
+from .program import Program
 from .tokenizer import TokenizerResult, Token
+from .tracing import get_trace_hook
 
 logger = logging.getLogger('Converter')
 
 
 class ConverterResult:
+    __slots__ = ('result', 'tokenizer_result', '_program')
+
     def __init__(self, result: List[Tuple[str, Token]], tokenizer_result: TokenizerResult):
         self.result = result
         self.tokenizer_result = tokenizer_result
 
+        self._program = None
+
+    @classmethod
+    def from_program(cls, program: Program):
+        # a loaded program has no lexemes behind it, the tokens are restored from the program itself
+        res = cls(program.to_rpn(), None)
+        res._program = program
+
+        return res
+
+    @property
+    def program(self) -> Program:
+        # built on the first evaluation, so its errors are raised there, as they always were
+        if self._program is None:
+            self._program = Program.from_rpn(self.result)
+
+        return self._program
+
     def __str__(self):
+        if self.tokenizer_result is None:
+            return ' '.join(item[0] for item in self.result)
+
         return str(self.tokenizer_result)
 
     def __repr__(self):
@@ -44,43 +69,49 @@ class Converter:
 
         stack = []
         result = []
+        trace = get_trace_hook()
 
         for item in tokenizer_result.result:
             if item[1] in (Token.INTEGER, Token.VARIABLE):
-                logger.debug(f'Pushing "{item}" to the result')
+                if trace is not None:
+                    trace('Converter', 'push_result', item=item)
                 result.append(item)
             elif item[1] == Token.FUNCTION:
-                logger.debug(f'Pushing function "{item}" on the stack')
+                if trace is not None:
+                    trace('Converter', 'push_stack', item=item)
                 stack.append(item)
             elif item[1] == Token.OPERATOR:
                 priority = self._get_priority(item)
-                logger.debug(
-                    f'Got an operator "{item}" with priority "{priority}"')
 
                 if stack and self._get_priority(stack[-1]) >= priority:
                     while stack and self._get_priority(stack[-1]) >= priority:
-                        logger.debug(f'Pushing "{stack[-1]}" to the result from the stack')
+                        if trace is not None:
+                            trace('Converter', 'pop_stack', item=stack[-1], priority=priority)
                         result.append(stack.pop())
 
-                logger.debug(f'Pushing "{item}" on the stack')
+                if trace is not None:
+                    trace('Converter', 'push_stack', item=item, priority=priority)
                 stack.append(item)
 
             elif item[1] == Token.BRACKET_OPEN:
-                logger.debug(f'Pushing "{item}" on the stack')
+                if trace is not None:
+                    trace('Converter', 'push_stack', item=item)
                 stack.append(item)
             elif item[1] == Token.BRACKET_CLOSE:
                 while stack[-1][1] != Token.BRACKET_OPEN:
-                    logger.debug(f'Pushing "{stack[-1]}" on the stack')
+                    if trace is not None:
+                        trace('Converter', 'pop_stack', item=stack[-1])
                     result.append(stack.pop())
 
-                logger.debug('Removing open bracket from the stack')
+                if trace is not None:
+                    trace('Converter', 'pop_stack', item=stack[-1])
                 stack.pop()  # remove open bracket
             else:
                 logger.error('wtf')
 
-        if stack:
-            logger.debug('Pushing all contents from the stack to the result')
-            while stack:
-                result.append(stack.pop())
+        while stack:
+            if trace is not None:
+                trace('Converter', 'pop_stack', item=stack[-1])
+            result.append(stack.pop())
 
         return ConverterResult(result, tokenizer_result)
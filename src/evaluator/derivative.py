@@ -0,0 +1,241 @@
+import logging
+from typing import Tuple, List
+
+from .consts import *
+from .converter import Converter, ConverterResult
+from .exceptions import EvaluatorException
+from .fast_lexer import FastLexer
+from .optimizer import Optimizer
+from .tokenizer import Token
+
+logger = logging.getLogger('Differentiator')
+
+# f'(x) of the functions, the chain rule multiplies it by the derivative of the argument;
+# co* functions are 1 / f(x) and are differentiated as such, the others have no derivative here
+DERIVATIVES = {
+    'sin': 'cos(x)',
+    'cos': '-sin(x)',
+    'tan': '1/cos(x)^2',
+    'asin': '1/sqrt(1-x^2)',
+    'acos': '-1/sqrt(1-x^2)',
+    'atan': '1/(1+x^2)',
+    'sinh': 'cosh(x)',
+    'cosh': 'sinh(x)',
+    'tanh': '1/cosh(x)^2',
+    'asinh': '1/sqrt(x^2+1)',
+    'acosh': '1/sqrt(x^2-1)',
+    'atanh': '1/(1-x^2)',
+    'exp': 'exp(x)',
+    'exp2': '2^x*0.6931471805599453',
+    'expm1': 'exp(x)',
+    'log': '1/x',
+    'ln': '1/x',
+    'log2': '1/(x*0.6931471805599453)',
+    'lb': '1/(x*0.6931471805599453)',
+    'log_two': '1/(x*0.6931471805599453)',
+    'log10': '1/(x*2.302585092994046)',
+    'lg': '1/(x*2.302585092994046)',
+    'log_ten': '1/(x*2.302585092994046)',
+    'log1p': '1/(1+x)',
+    'sqrt': '0.5/sqrt(x)',
+    'cbrt': '1/(3*cbrt(x)^2)',
+    # 2 / sqrt(pi), the minus is written as 0 - x^2, -x^2 would be (-x)^2
+    'erf': 'exp(0-x^2)*1.1283791670955126',
+    'erfc': 'exp(0-x^2)*-1.1283791670955126',
+    'fabs': 'x/fabs(x)',
+    'degrees': '57.29577951308232',
+    'radians': '0.017453292519943295',
+    # piecewise constant, the jumps are ignored
+    'floor': '0',
+    'ceil': '0',
+    'trunc': '0'
+}
+
+ZERO = ([('0', Token.INTEGER)], 0.0)
+ONE = ([('1', Token.INTEGER)], 1.0)
+MINUS_ONE = ([('-1', Token.INTEGER)], -1.0)
+
+
+class Differentiator:
+    def __init__(self):
+        self._optimizer = Optimizer()
+
+        # function name -> RPN of its derivative, parsed on first use
+        self._rules = None
+
+    def differentiate(self, converter_result: ConverterResult):
+        assert converter_result
+
+        # works like the optimizer: every stack item is a pair of (tokens of the subtree, value if it is a number),
+        # one for the subtree and one for its derivative
+        stack = []
+
+        for item in converter_result.result:
+            if item[1] == Token.INTEGER:
+                stack.append((([item], self._parse_constant(item)), ZERO))
+            elif item[1] == Token.VARIABLE:
+                stack.append((([item], None), MINUS_ONE if item[0].startswith(SYMBOL_MINUS) else ONE))
+            elif item[1] == Token.OPERATOR:
+                right = stack.pop()
+                left = stack.pop()
+
+                stack.append(self._differentiate_operator(item, left, right))
+            elif item[1] == Token.FUNCTION:
+                value = stack.pop()
+
+                stack.append(((value[0][0] + [item], None), self._differentiate_function(item, value)))
+            else:
+                raise EvaluatorException(f'Unexpected token {item}')
+
+        result = [token for entry in stack for token in entry[1][0]]
+
+        # the rules above leave constant subtrees like 2 1 - behind, the optimizer folds them
+        return self._optimizer.optimize(ConverterResult(result, None))
+
+    def _parse_constant(self, item: Tuple[str, Token]):
+        try:
+            return float(item[0])
+        except ValueError:
+            return None
+
+    def _differentiate_operator(self, item: Tuple[str, Token], left: Tuple, right: Tuple):
+        (f, df), (g, dg) = left, right
+        operator = item[0]
+
+        if operator == SYMBOL_PLUS:
+            return self._apply(f, g, item), self._add(df, dg)
+        if operator == SYMBOL_MINUS:
+            return self._apply(f, g, item), self._sub(df, dg)
+        if operator == SYMBOL_MULTIPLY:
+            return self._apply(f, g, item), self._add(self._mul(df, g), self._mul(f, dg))
+        if operator == SYMBOL_DIVIDE:
+            if dg[1] == 0:
+                return self._apply(f, g, item), self._div(df, g)
+
+            numerator = self._sub(self._mul(df, g), self._mul(f, dg))
+            return self._apply(f, g, item), self._div(numerator, self._pow(g, self._constant(2.0)))
+        if operator == SYMBOL_DEGREE:
+            return self._apply(f, g, item), self._differentiate_power(f, df, g, dg)
+
+        raise EvaluatorException(f'Unknown operation {item}')
+
+    def _differentiate_power(self, f: Tuple, df: Tuple, g: Tuple, dg: Tuple):
+        power = self._pow(f, g)
+
+        # x^n
+        if dg[1] == 0:
+            exponent = self._constant(g[1] - 1) if g[1] is not None else self._sub(g, ONE)
+            return self._mul(self._mul(g, self._pow(f, exponent)), df)
+
+        log = (f[0] + [('ln', Token.FUNCTION)], None)
+
+        # n^x
+        if df[1] == 0:
+            return self._mul(self._mul(power, log), dg)
+
+        # x^x: f^g * (g' ln f + g f' / f)
+        return self._mul(power, self._add(self._mul(dg, log), self._div(self._mul(g, df), f)))
+
+    def _differentiate_function(self, item: Tuple[str, Token], value: Tuple):
+        u, du = value
+        if du[1] == 0:
+            return ZERO
+
+        name = item[0]
+        negative = name.startswith(SYMBOL_MINUS)
+        if negative:
+            name = name[1:]
+
+        rules = self._rules or self._load_rules()
+
+        rule = rules.get(name)
+        if rule is not None:
+            res = self._mul(self._substitute(rule, u), du)
+        elif name.startswith('co') and name[2:] in rules:
+            # (1 / f(u))' = -f'(u) u' / f(u)^2
+            inner = (u[0] + [(name[2:], Token.FUNCTION)], None)
+            derivative = self._mul(self._substitute(rules[name[2:]], u), du)
+
+            res = self._mul(MINUS_ONE, self._div(derivative, self._pow(inner, self._constant(2.0))))
+        else:
+            raise EvaluatorException(f'No derivative of function {name}')
+
+        return self._mul(MINUS_ONE, res) if negative else res
+
+    def _load_rules(self):
+        lexer = FastLexer()
+        converter = Converter()
+
+        self._rules = {}
+
+        for name, rule in DERIVATIVES.items():
+            self._rules[name] = converter.convert(lexer.parse(rule)).result
+
+        return self._rules
+
+    def _substitute(self, rule: List[Tuple[str, Token]], u: Tuple):
+        # the rule's x is replaced with the argument of the function
+        if len(rule) == 1 and rule[0][1] == Token.INTEGER:
+            return [rule[0]], float(rule[0][0])
+
+        result = []
+
+        for item in rule:
+            if item[1] != Token.VARIABLE:
+                result.append(item)
+            elif item[0].startswith(SYMBOL_MINUS):
+                result += u[0] + MINUS_ONE[0] + [(SYMBOL_MULTIPLY, Token.OPERATOR)]
+            else:
+                result += u[0]
+
+        return result, None
+
+    def _constant(self, value: float):
+        return [(repr(value), Token.INTEGER)], value
+
+    def _apply(self, left: Tuple, right: Tuple, item: Tuple[str, Token]):
+        return left[0] + right[0] + [item], None
+
+    # the helpers below drop the terms that are known to be 0 or 1, derivatives are full of them
+
+    def _add(self, left: Tuple, right: Tuple):
+        if left[1] == 0:
+            return right
+        if right[1] == 0:
+            return left
+
+        return self._apply(left, right, (SYMBOL_PLUS, Token.OPERATOR))
+
+    def _sub(self, left: Tuple, right: Tuple):
+        if right[1] == 0:
+            return left
+        if left[1] == 0:
+            return self._mul(MINUS_ONE, right)
+
+        return self._apply(left, right, (SYMBOL_MINUS, Token.OPERATOR))
+
+    def _mul(self, left: Tuple, right: Tuple):
+        if left[1] == 0 or right[1] == 0:
+            return ZERO
+        if left[1] == 1:
+            return right
+        if right[1] == 1:
+            return left
+
+        return self._apply(left, right, (SYMBOL_MULTIPLY, Token.OPERATOR))
+
+    def _div(self, left: Tuple, right: Tuple):
+        if left[1] == 0:
+            return ZERO
+        if right[1] == 1:
+            return left
+
+        return self._apply(left, right, (SYMBOL_DIVIDE, Token.OPERATOR))
+
+    def _pow(self, left: Tuple, right: Tuple):
+        if right[1] == 0:
+            return ONE
+        if right[1] == 1:
+            return left
+
+        return self._apply(left, right, (SYMBOL_DEGREE, Token.OPERATOR))
@@ -1,10 +1,15 @@
 import logging
-from typing import List, Tuple, Union
+import math
+from typing import List, Tuple, Union, Callable, Optional
 
 from .consts import *
 from .converter import ConverterResult
 from .exceptions import EvaluatorException
+from .program import Program, OP_CONST, OP_VAR, OP_NEG_VAR, OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_POW, OP_FUNCTION, \
+    OP_NEG_FUNCTION, SYMBOLS
 from .tokenizer import Token
+from .tracing import get_trace_hook
+from .ufuncs import numpy, apply_operator, get_ufunc
 
 logger = logging.getLogger('Evaluator')
 
@@ -18,12 +23,23 @@ class Evaluator:
             SYMBOL_DIVIDE: lambda left, right: left / right,
             SYMBOL_DEGREE: lambda left, right: left ** right
         }
+        self._compiled_operators = {
+            SYMBOL_PLUS: '+',
+            SYMBOL_MINUS: '-',
+            SYMBOL_MULTIPLY: '*',
+            SYMBOL_DIVIDE: '/',
+            SYMBOL_DEGREE: '**'
+        }
 
     def eval(self, converter_result: ConverterResult, x: float = 0):
         assert converter_result
 
         try:
-            res = self._eval(converter_result.result, x)
+            if get_trace_hook() is None:
+                res = self._run(converter_result.program, x)
+            else:
+                # the token interpreter, so every step is traced along with its token
+                res = self._eval(converter_result.result, x)
 
             if not isinstance(res, float):
                 res = float(res)
@@ -36,8 +52,183 @@ class Evaluator:
             logger.debug('Unable to evaluate because of domain error')
             return None
 
+    def eval_array(self, converter_result: ConverterResult, xs):
+        assert converter_result
+
+        np = numpy()
+        xs = np.asarray(xs, dtype=float)
+
+        # domain and division errors become NaN instead of None
+        with np.errstate(all='ignore'):
+            try:
+                res = self._eval_array(converter_result.program, xs, np)
+            except ValueError:
+                logger.debug('Unable to evaluate because of domain error')
+                res = np.nan
+
+        return np.array(np.broadcast_to(res, xs.shape), dtype=float)
+
+    def _eval_array(self, program: Program, xs, np):
+        stack = []
+        constants = program.constants
+        names = program.names
+
+        # a step that failed gives NaN, but a later one can clear it again (NaN^0 == 1, isnan(NaN) == 1),
+        # so every NaN is remembered and wins at the end, as None does on the scalar path
+        invalid = np.zeros(xs.shape, dtype=bool)
+
+        for opcode, arg in zip(program.opcodes, program.args):
+            if opcode == OP_CONST:
+                stack.append(constants[arg])
+            elif opcode == OP_VAR:
+                stack.append(xs)
+            elif opcode == OP_NEG_VAR:
+                stack.append(-xs)
+            elif opcode == OP_FUNCTION or opcode == OP_NEG_FUNCTION:
+                value = stack.pop()
+
+                func = get_ufunc(names[arg])
+                if not func:
+                    raise EvaluatorException(f'Unknown function {names[arg]}')
+
+                res = func(value)
+                if opcode == OP_NEG_FUNCTION:
+                    res = -res
+
+                invalid |= np.isnan(res)
+                stack.append(res)
+            else:
+                right = stack.pop()
+                left = stack.pop()
+
+                res = apply_operator(np, SYMBOLS[opcode], left, right)
+
+                invalid |= np.isnan(res)
+                stack.append(res)
+
+        return np.where(invalid, np.nan, stack.pop())
+
+    def compile(self, converter_result: ConverterResult) -> Callable[[float], Optional[float]]:
+        assert converter_result
+
+        # RPN is translated into straight-line code, one local per stack slot,
+        # so deep expressions don't hit the nesting limits of the Python parser
+        namespace = {}
+        lines = []
+        stack = []
+
+        for item in converter_result.result:
+            if item[1] == Token.INTEGER:
+                stack.append(self._compile_constant(item, namespace))
+            elif item[1] == Token.VARIABLE:
+                stack.append('(-x)' if item[0].startswith(SYMBOL_MINUS) else 'x')
+            elif item[1] == Token.OPERATOR:
+                operator = self._compiled_operators.get(item[0])
+                if not operator:
+                    raise EvaluatorException(f'Unknown operation {item}')
+
+                right = stack.pop()
+                left = stack.pop()
+
+                slot = f's{len(stack)}'
+                lines.append(f'{slot} = {left} {operator} {right}')
+                stack.append(slot)
+            elif item[1] == Token.FUNCTION:
+                value = stack.pop()
+
+                name = item[0]
+                sign = ''
+
+                if name.startswith(SYMBOL_MINUS):
+                    name = name[1:]
+                    sign = '-'
+
+                func = FUNCTIONS.get(name)
+                if not func:
+                    raise EvaluatorException(f'Unknown function {name}')
+
+                func_name = f'f{len(namespace)}'
+                namespace[func_name] = func
+
+                slot = f's{len(stack)}'
+                lines.append(f'{slot} = {sign}{func_name}({value})')
+                stack.append(slot)
+            else:
+                logger.error('wtf')
+
+        lines.append(f'return float({stack.pop()})')
+
+        body = '\n'.join(' ' * 8 + line for line in lines)
+        source = (
+            'def compiled_expression(x=0):\n'
+            '    try:\n'
+            f'{body}\n'
+            '    except (ZeroDivisionError, ValueError):\n'
+            '        return None\n'
+        )
+        logger.debug(f'Compiled expression:\n{source}')
+
+        exec(compile(source, '<expression>', 'exec'), namespace)
+
+        func = namespace['compiled_expression']
+        func.source = source
+
+        return func
+
+    def _compile_constant(self, item: Tuple[str, Token], namespace: dict):
+        try:
+            value = float(item[0])
+        except ValueError:
+            # keep the failure for the evaluation time, as the interpreter does
+            return f'float({item[0]!r})'
+
+        if math.isfinite(value):
+            return f'({value!r})' if value < 0 else repr(value)
+
+        name = f'c{len(namespace)}'
+        namespace[name] = value
+
+        return name
+
+    def _run(self, program: Program, x: float):
+        # every stack item is a float, functions get floats and their results are converted right away
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        constants = program.constants
+        functions = program.functions
+
+        for opcode, arg in zip(program.opcodes, program.args):
+            if opcode == OP_CONST:
+                push(constants[arg])
+            elif opcode == OP_VAR:
+                push(float(x))
+            elif opcode == OP_NEG_VAR:
+                push(-float(x))
+            elif opcode == OP_FUNCTION:
+                push(float(functions[arg](float(pop()))))
+            elif opcode == OP_NEG_FUNCTION:
+                push(-float(functions[arg](float(pop()))))
+            else:
+                right = pop()
+                left = pop()
+
+                if opcode == OP_ADD:
+                    push(left + right)
+                elif opcode == OP_SUB:
+                    push(left - right)
+                elif opcode == OP_MUL:
+                    push(left * right)
+                elif opcode == OP_DIV:
+                    push(left / right)
+                else:
+                    push(left ** right)
+
+        return pop()
+
     def _eval(self, expression: List[Tuple[Union[str, int], Token]], x: float):
         stack = []
+        trace = get_trace_hook()
 
         for item in expression:
             if item[1] == Token.INTEGER:
@@ -56,6 +247,9 @@ class Evaluator:
             else:
                 logger.error('wtf')
 
+            if trace is not None:
+                trace('Evaluator', 'push', item=item, value=stack[-1][0], depth=len(stack))
+
         res = stack.pop()
 
         return res[0]
@@ -0,0 +1,280 @@
+import logging
+import string
+
+from .consts import *
+from .exceptions import LexerException
+from .lexer import LexerResult, EXPECTATIONS
+from .tokenizer import Tokenizer, TokenizerResult, Token
+from .tracing import get_trace_hook
+
+logger = logging.getLogger('Lexer')
+
+# character classes
+DIGIT = 0
+OPEN = 1
+CLOSE = 2
+MINUS = 3
+OPERATOR = 4
+COMMA = 5
+LETTER = 6
+VARIABLE = 7
+SPACE = 8
+OTHER = 9
+
+# states, same meaning as in Lexer
+S = 0
+I = 1
+R = 2
+B = 3
+F = 4
+X = 5
+
+STATE_NAMES = 'SIRBFX'
+
+CLASSES = {chr(code): OTHER for code in range(128)}
+CLASSES.update({ch: DIGIT for ch in string.digits})
+CLASSES.update({ch: LETTER for ch in ALPHABET})
+CLASSES.update({ch: OPERATOR for ch in OPERATORS})
+CLASSES.update({ch: COMMA for ch in COMMAS})
+CLASSES.update({
+    SYMBOL_BRACKET_OPEN: OPEN,
+    SYMBOL_BRACKET_CLOSE: CLOSE,
+    SYMBOL_MINUS: MINUS,
+    SYMBOL_VARIABLE: VARIABLE,
+    ' ': SPACE
+})
+
+
+def _classify_char(ch: str):
+    # outside of ASCII only str.isdigit() matters, exactly as in Lexer
+    return DIGIT if ch.isdigit() else OTHER
+
+
+class ScanState:
+    # everything FastLexer knows after a prefix of the input, enough to continue with the rest of it
+    __slots__ = ('state', 'buffer', 'brackets', 'is_function', 'index', 'lexemes', 'tokens')
+
+    def __init__(self, state=S, buffer='', brackets=0, is_function=False, index=0, lexemes=None, tokens=None):
+        self.state = state
+        self.buffer = buffer
+        self.brackets = brackets
+        self.is_function = is_function
+        self.index = index
+        self.lexemes = [] if lexemes is None else lexemes
+        self.tokens = [] if tokens is None else tokens
+
+    def truncate(self, lexemes: int, tokens: int):
+        del self.lexemes[lexemes:]
+        del self.tokens[tokens:]
+
+
+# Lexer and Tokenizer in one pass: the same state machine, but table-driven and emitting typed tokens right away,
+# results and errors (positions and messages) are exactly the ones of Lexer + Tokenizer
+class FastLexer:
+    def __init__(self):
+        self._tokenizer = Tokenizer()
+
+    def parse(self, s: str):
+        if not s:
+            raise LexerException(0, 'Empty input string')
+
+        return self.finish(s, self.scan(s))
+
+    def scan(self, s: str, start: int = 0, scan_state: ScanState = None):
+        # runs the state machine over s[start:], continuing from scan_state (which is updated in place)
+        if scan_state is None:
+            scan_state = ScanState()
+
+        classes = CLASSES
+        trace = get_trace_hook()
+        lexemes = scan_state.lexemes
+        tokens = scan_state.tokens
+
+        state = scan_state.state
+        buffer = scan_state.buffer
+        brackets = scan_state.brackets
+        is_function = scan_state.is_function
+        index = scan_state.index
+
+        for i in range(start, len(s)):
+            ch = s[i]
+            cls = classes.get(ch)
+            if cls is None:
+                cls = _classify_char(ch)
+
+            if cls == SPACE:
+                continue
+
+            index = i
+            source = state
+
+            if state == S:
+                if cls == DIGIT:
+                    buffer += ch
+                    state = I
+                elif cls == OPEN:
+                    brackets += 1
+                    lexemes.append(ch)
+                    tokens.append((ch, Token.BRACKET_OPEN))
+                elif cls == MINUS:
+                    buffer += ch
+                elif cls == LETTER:
+                    buffer += ch
+                    state = F
+                elif cls == VARIABLE:
+                    is_function = True
+
+                    buffer += ch
+                    lexemes.append(buffer)
+                    tokens.append((buffer, Token.VARIABLE))
+                    buffer = ''
+                    state = X
+                else:
+                    self._raise_exception(state, ch, index)
+            elif state == I or state == R:
+                if cls == DIGIT:
+                    buffer += ch
+                elif cls == COMMA and state == I:
+                    buffer += '.'
+                    state = R
+                elif cls == CLOSE:
+                    brackets -= 1
+                    if buffer:
+                        lexemes.append(buffer)
+                        tokens.append((buffer, Token.INTEGER))
+                        buffer = ''
+                    lexemes.append(ch)
+                    tokens.append((ch, Token.BRACKET_CLOSE))
+                    state = B
+                elif cls == OPERATOR or cls == MINUS:
+                    if buffer:
+                        lexemes.append(buffer)
+                        tokens.append((buffer, Token.INTEGER))
+                        buffer = ''
+                    lexemes.append(ch)
+                    tokens.append((ch, Token.OPERATOR))
+                    state = S
+                else:
+                    self._raise_exception(state, ch, index)
+            elif state == F:
+                if cls == LETTER or cls == VARIABLE:
+                    buffer += ch
+                elif cls == OPEN:
+                    brackets += 1
+                    lexemes.append(buffer)
+                    tokens.append((buffer, Token.FUNCTION))
+                    buffer = ''
+                    lexemes.append(ch)
+                    tokens.append((ch, Token.BRACKET_OPEN))
+                    state = S
+                else:
+                    self._raise_exception(state, ch, index)
+            else:
+                # B and X
+                if cls == CLOSE:
+                    brackets -= 1
+                    lexemes.append(ch)
+                    tokens.append((ch, Token.BRACKET_CLOSE))
+                    state = B
+                elif cls == OPERATOR or cls == MINUS:
+                    if buffer:
+                        lexemes.append(buffer)
+                        tokens.append((buffer, self._tokenizer.classify(buffer)))
+                        buffer = ''
+                    lexemes.append(ch)
+                    tokens.append((ch, Token.OPERATOR))
+                    state = S
+                else:
+                    self._raise_exception(state, ch, index)
+
+            if trace is not None:
+                # the same events as Lexer
+                trace('Lexer', 'transition', index=i, char=ch, source=STATE_NAMES[source], target=STATE_NAMES[state])
+
+        scan_state.state = state
+        scan_state.buffer = buffer
+        scan_state.brackets = brackets
+        scan_state.is_function = is_function
+        scan_state.index = index
+
+        return scan_state
+
+    def finish(self, s: str, scan_state: ScanState):
+        # end of the input: flush the buffer and check what can only be checked at the end,
+        # the result takes over the lists of scan_state
+        if not s:
+            raise LexerException(0, 'Empty input string')
+
+        state = scan_state.state
+        buffer = scan_state.buffer
+        lexemes = scan_state.lexemes
+        tokens = scan_state.tokens
+
+        if buffer:
+            if state == I or state == R:
+                token = Token.INTEGER
+            elif state == F:
+                token = Token.FUNCTION
+            else:
+                token = self._tokenizer.classify(buffer)
+
+            lexemes.append(buffer)
+            tokens.append((buffer, token))
+
+        if scan_state.brackets != 0:
+            self._raise_exception('B_ERR', scan_state.brackets, scan_state.index)
+
+        if lexemes[-1] in OPERATORS or lexemes[-1] in FUNCTIONS:
+            self._raise_exception(S, '', len(s) + 1)
+
+        return TokenizerResult(tokens, LexerResult(lexemes, scan_state.is_function))
+
+    def _raise_exception(self, state, ch, index: int):
+        expected = EXPECTATIONS[STATE_NAMES[state] if isinstance(state, int) else state]
+
+        msg = f'Excepted {expected}, but got "{ch}"'
+
+        logger.error(msg)
+
+        raise LexerException(index, msg)
+
+
+class IncrementalLexer:
+    # FastLexer for text that is typed: when the new text only appends to the previous one, the scan continues
+    # from where the previous one stopped instead of starting over;
+    # nothing is copied, the lists of the state are only appended to and cut back to the scanned prefix
+    # (after a failed scan and before the next one, as finish() appends the last lexeme), so the result
+    # shares them and is only valid until the next parse()
+    def __init__(self):
+        self._lexer = FastLexer()
+
+        self._text = ''
+        self._state = ScanState()
+        self._scanned = (0, 0)
+
+    def parse(self, s: str):
+        self._state.truncate(*self._scanned)
+
+        if s.startswith(self._text):
+            state = self._state
+
+            try:
+                self._lexer.scan(s, len(self._text), state)
+            except LexerException:
+                # the scalars are only written back by a successful scan, the lists are cut here
+                state.truncate(*self._scanned)
+                raise
+        else:
+            state = self._lexer.scan(s)
+
+        # only a prefix that scanned without errors is remembered, so a typo doesn't reset it
+        self._text = s
+        self._state = state
+        self._scanned = (len(state.lexemes), len(state.tokens))
+
+        return self._lexer.finish(s, state)
+
+    def reset(self):
+        self._text = ''
+        self._state = ScanState()
+        self._scanned = (0, 0)
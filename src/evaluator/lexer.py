@@ -4,11 +4,24 @@ from typing import List
 from .consts import *
 from .consts import FUNCTIONS
 from .exceptions import LexerException
+from .tracing import get_trace_hook
 
 logger = logging.getLogger('Lexer')
 
+EXPECTATIONS = {
+    'S': 'number, letter, unary minus or opening bracket',
+    'I': 'number, operator, comma or closing bracket',
+    'R': 'number, operator or closing bracket',
+    'B': 'operator or closing bracket',
+    'F': 'letter or opening bracket',
+    'X': 'closing bracket or operator',
+    'B_ERR': 'right brackets count'
+}
+
 
 class LexerResult:
+    __slots__ = ('result', 'is_function')
+
     def __init__(self, result: List[str], is_function: bool):
         self.result = result
         self.is_function = is_function
@@ -41,6 +54,7 @@ class Lexer:
         self._brackets_count = 0
         self._is_function = False
         self._result = []
+        self._trace = None
 
         self._machine = {
             'S': self._state_s,
@@ -50,33 +64,28 @@ class Lexer:
             'F': self._state_f,
             'X': self._state_x
         }
-        self._expectations = {
-            'S': 'number, letter, unary minus or opening bracket',
-            'I': 'number, operator, comma or closing bracket',
-            'R': 'number, operator or closing bracket',
-            'B': 'operator or closing bracket',
-            'F': 'letter or opening bracket',
-            'X': 'closing bracket or operator',
-            'B_ERR': 'right brackets count'
-        }
+        self._expectations = EXPECTATIONS
 
         assert all(item in self._expectations for item in self._machine.keys())
 
     def _flush_buffer(self):
         if self._buffer:
-            logger.debug(f'Flushing buffer with "{self._buffer}"')
+            if self._trace is not None:
+                self._trace('Lexer', 'flush_buffer', lexeme=self._buffer)
 
             self._result.append(self._buffer)
             self._buffer = ''
-        else:
-            logger.debug('Nothing to flush')
 
     def _append_current_char(self):
-        logger.debug(f'Buffering "{self._current_char}"')
+        if self._trace is not None:
+            self._trace('Lexer', 'buffer', char=self._current_char)
+
         self._buffer += self._current_char
 
     def _flush_current_char(self):
-        logger.debug(f'Flushing "{self._current_char}"')
+        if self._trace is not None:
+            self._trace('Lexer', 'flush_char', char=self._current_char)
+
         self._result.append(self._current_char)
 
     def _reset(self):
@@ -87,6 +96,7 @@ class Lexer:
         self._brackets_count = 0
         self._is_function = False
         self._result = []
+        self._trace = None
 
     def _state_s(self):
         if self._current_char.isdigit():
@@ -187,6 +197,8 @@ class Lexer:
         if not s:
             raise LexerException(0, 'Empty input string')
 
+        self._trace = trace = get_trace_hook()
+
         for i, ch in enumerate(s):
             if ch == ' ':
                 continue
@@ -198,6 +210,9 @@ class Lexer:
             if state is None:
                 self._raise_exception()
 
+            if trace is not None:
+                trace('Lexer', 'transition', index=i, char=ch, source=self._state, target=state)
+
             self._state = state
 
         self._flush_buffer()
@@ -0,0 +1,136 @@
+import mmap
+import os
+import struct
+from typing import Iterable, Union
+
+from .program import Program
+from .wrapper import EasyWrapper
+
+# a precompiled set of expressions, little-endian: header (magic, version, count), then an index entry per expression
+# (offset and size of its UTF-8 source, offset and size of its program) and the blobs themselves;
+# only the index is read at startup, programs are decoded from the mapped file when they are asked for
+MAGIC = b'RPNL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBxxxI')
+ENTRY = struct.Struct('<QIQI')
+
+
+def save_library(path: Union[str, os.PathLike], expressions: Iterable[Union[str, EasyWrapper]]):
+    entries = []
+
+    for expression in expressions:
+        wrapper = EasyWrapper.from_string(expression) if isinstance(expression, str) else expression
+        if not wrapper.valid:
+            raise wrapper.err
+
+        entries.append((wrapper.source.encode(), wrapper.converter_result.program.to_bytes()))
+
+    offset = HEADER.size + ENTRY.size * len(entries)
+    index = []
+
+    for source, program in entries:
+        index.append(ENTRY.pack(offset, len(source), offset + len(source), len(program)))
+        offset += len(source) + len(program)
+
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries)))
+        file.writelines(index)
+
+        for source, program in entries:
+            file.write(source)
+            file.write(program)
+
+    return len(entries)
+
+
+class ProgramLibrary:
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = path
+
+        self._file = open(path, 'rb')
+        self._mapped = None
+        self._index = {}
+        self._programs = {}
+        self._wrappers = {}
+
+        try:
+            self._load_index()
+        except BaseException:
+            self.close()
+            raise
+
+    def _load_index(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f'{self.path} is not a program library: too short')
+
+        self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = HEADER.unpack_from(self._mapped)
+        if magic != MAGIC:
+            raise ValueError(f'{self.path} is not a program library: bad magic {magic!r}')
+        if version > FORMAT_VERSION:
+            raise ValueError(f'Unsupported library version {version}, the latest known is {FORMAT_VERSION}')
+        if HEADER.size + ENTRY.size * count > size:
+            raise ValueError(f'{self.path} is corrupted: truncated index')
+
+        for i in range(count):
+            source_offset, source_size, program_offset, program_size = \
+                ENTRY.unpack_from(self._mapped, HEADER.size + ENTRY.size * i)
+
+            if max(source_offset + source_size, program_offset + program_size) > size:
+                raise ValueError(f'{self.path} is corrupted: entry {i} is out of the file')
+
+            source = self._mapped[source_offset:source_offset + source_size].decode()
+            self._index[source] = (program_offset, program_size)
+
+    def get_program(self, source: str) -> Program:
+        program = self._programs.get(source)
+
+        if program is None:
+            offset, size = self._index[source]
+
+            with memoryview(self._mapped) as view:
+                program = Program.from_bytes(view[offset:offset + size])
+
+            self._programs[source] = program
+
+        return program
+
+    def get_wrapper(self, source: str) -> EasyWrapper:
+        # expressions missing from the library are parsed as usual; wrappers of the library are kept here and not
+        # in EasyWrapper.cache, they have no lexemes and from_string() must not hand them out
+        if source not in self._index:
+            return EasyWrapper.from_string(source)
+
+        wrapper = self._wrappers.get(source)
+
+        if wrapper is None:
+            wrapper = self._wrappers[source] = EasyWrapper.from_program(self.get_program(source), source)
+
+        return wrapper
+
+    def __contains__(self, source: str):
+        return source in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f'ProgramLibrary(path={self.path!r}, expressions={len(self._index)}, loaded={len(self._programs)})'
@@ -0,0 +1,67 @@
+import logging
+import sys
+from contextlib import contextmanager
+
+format = ' {name:10} {asctime}   {levelname:10} | {message}'
+datefmt = '%I:%M:%S %p'
+padding = ' ' * (format.index('|') + 1)
+
+
+class ColoredFormatter(logging.Formatter):
+    debug_color = '\033[36m'
+    info_color = '\033[32m'
+    warning_color = '\033[33m'
+    error_color = '\033[31m'
+    critical_color = '\033[31m' + '\033[1m'
+
+    reset = "\x1b[0m"
+
+    FORMATS = {
+        logging.DEBUG: debug_color + format + reset,
+        logging.INFO: info_color + format + reset,
+        logging.WARNING: warning_color + format + reset,
+        logging.ERROR: error_color + format + reset,
+        logging.CRITICAL: critical_color + format + reset
+    }
+    FORMATTERS = {k: logging.Formatter(v, datefmt, '{') for k, v in FORMATS.items()}
+
+    def format(self, record):
+        formatter = self.FORMATTERS.get(record.levelno)
+        return formatter.format(record)
+
+
+colored_formatter = ColoredFormatter(style='{')
+
+
+def create_console_handler(level: int = logging.INFO):
+    console_logger = logging.StreamHandler(sys.stdout)
+    console_logger.setLevel(level)
+    console_logger.setFormatter(colored_formatter)
+
+    return console_logger
+
+
+def setup_logging(level: int = logging.INFO):
+    # used to run on import, now it's up to the application
+    logging.basicConfig(format=format, datefmt=datefmt, style='{', level=level,
+                        handlers=[create_console_handler(level)])
+
+
+# the evaluator logs under the names of its stages, the trace hook too
+LOGGERS = ('Lexer', 'Tokenizer', 'Converter', 'Optimizer', 'Evaluator', 'Differentiator', 'Solver')
+
+
+@contextmanager
+def silenced(names=LOGGERS):
+    # only these loggers, the rest of the application logs as it did
+    loggers = [logging.getLogger(name) for name in names]
+    levels = [logger.level for logger in loggers]
+
+    for logger in loggers:
+        logger.setLevel(logging.CRITICAL + 1)
+
+    try:
+        yield
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
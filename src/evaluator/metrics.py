@@ -0,0 +1,79 @@
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+# the same contract as the trace hook: instrumented code fetches the sink once per call and measures nothing
+# while it is None, so metrics cost nothing unless enabled
+# a sink is any callable taking (name, value), times are reported in seconds under names ending with ".seconds"
+_sink = None
+
+_NULL_TIMER = nullcontext()
+
+
+def get_metrics_sink():
+    return _sink
+
+
+def set_metrics_sink(sink):
+    global _sink
+
+    previous = _sink
+    _sink = sink
+
+    return previous
+
+
+class _Timer:
+    __slots__ = ('sink', 'name', 'started')
+
+    def __init__(self, sink, name: str):
+        self.sink = sink
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.sink(self.name, time.perf_counter() - self.started)
+
+
+def timer(sink, name: str):
+    return _NULL_TIMER if sink is None else _Timer(sink, name)
+
+
+class MetricsRecorder:
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+
+        self._previous = None
+
+    def __call__(self, name: str, value: float):
+        self.totals[name] += value
+        self.counts[name] += 1
+
+    def mean(self, name: str):
+        return self.totals[name] / self.counts[name] if self.counts[name] else 0.0
+
+    def summary(self):
+        lines = []
+
+        for name in sorted(self.totals):
+            if name.endswith('.seconds'):
+                lines.append(f'{name:36} {self.totals[name] * 1000:12.3f} ms in {self.counts[name]} calls')
+            else:
+                lines.append(f'{name:36} {self.totals[name]:12.0f} in {self.counts[name]} calls')
+
+        return '\n'.join(lines)
+
+    def __enter__(self):
+        self._previous = set_metrics_sink(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        set_metrics_sink(self._previous)
+
+    def __repr__(self):
+        return f'MetricsRecorder(metrics={len(self.totals)})'
@@ -0,0 +1,100 @@
+import logging
+from typing import Tuple, List
+
+from .consts import *
+from .converter import ConverterResult
+from .evaluator import Evaluator
+from .exceptions import EvaluatorException
+from .tokenizer import Token
+from .tracing import get_trace_hook
+
+logger = logging.getLogger('Optimizer')
+
+
+class Optimizer:
+    def __init__(self):
+        self._evaluator = Evaluator()
+
+        # operator -> (neutral right operand, neutral left operand)
+        self._identities = {
+            SYMBOL_PLUS: (0.0, 0.0),
+            SYMBOL_MINUS: (0.0, None),
+            SYMBOL_MULTIPLY: (1.0, 1.0),
+            SYMBOL_DIVIDE: (1.0, None),
+            SYMBOL_DEGREE: (1.0, None)
+        }
+
+    def optimize(self, converter_result: ConverterResult):
+        assert converter_result
+
+        # every stack item is (tokens of the subtree, value if the subtree is constant)
+        stack = []
+
+        for item in converter_result.result:
+            if item[1] == Token.INTEGER:
+                stack.append(([item], self._parse_constant(item)))
+            elif item[1] == Token.OPERATOR:
+                right = stack.pop()
+                left = stack.pop()
+
+                stack.append(self._optimize_operator(item, left, right))
+            elif item[1] == Token.FUNCTION:
+                value = stack.pop()
+
+                stack.append(self._optimize_function(item, value))
+            else:
+                stack.append(([item], None))
+
+        result = [token for entry in stack for token in entry[0]]
+
+        return ConverterResult(result, converter_result.tokenizer_result)
+
+    def _trace_fold(self, item: Tuple[str, Token], value: float):
+        trace = get_trace_hook()
+        if trace is not None:
+            trace('Optimizer', 'fold', item=item, value=value)
+
+    def _parse_constant(self, item: Tuple[str, Token]):
+        try:
+            return float(item[0])
+        except ValueError:
+            return None
+
+    def _make_constant(self, value: float):
+        return [(repr(value), Token.INTEGER)], value
+
+    def _optimize_operator(self, item: Tuple[str, Token], left: Tuple[List, float], right: Tuple[List, float]):
+        if left[1] is not None and right[1] is not None:
+            # errors are left for the evaluation time, so they end up as None as before
+            try:
+                value = self._evaluator._eval_operator(item, left[1], right[1])
+            except (ZeroDivisionError, ValueError, OverflowError, TypeError, EvaluatorException):
+                value = None
+
+            if isinstance(value, float):
+                self._trace_fold(item, value)
+                return self._make_constant(value)
+
+        identity = self._identities.get(item[0])
+        if identity:
+            neutral_right, neutral_left = identity
+
+            if right[1] is not None and right[1] == neutral_right:
+                return left
+            if left[1] is not None and left[1] == neutral_left:
+                return right
+
+        return left[0] + right[0] + [item], None
+
+    def _optimize_function(self, item: Tuple[str, Token], value: Tuple[List, float]):
+        if value[1] is not None:
+            try:
+                res = float(self._evaluator._eval_function(item, value[1]))
+            except (ZeroDivisionError, ValueError, OverflowError, TypeError, EvaluatorException):
+                res = None
+
+            if res is not None:
+                self._trace_fold(item, res)
+                return self._make_constant(res)
+
+        return value[0] + [item], None
@@ -0,0 +1,224 @@
+import struct
+import sys
+from array import array
+from typing import List, Tuple, Union
+
+from .consts import *
+from .exceptions import EvaluatorException
+from .tokenizer import Token
+
+# opcodes, the argument of CONST is an index in the constant pool, of FUNCTION and NEG_FUNCTION in the function table
+OP_CONST = 0
+OP_VAR = 1
+OP_NEG_VAR = 2
+OP_ADD = 3
+OP_SUB = 4
+OP_MUL = 5
+OP_DIV = 6
+OP_POW = 7
+OP_FUNCTION = 8
+OP_NEG_FUNCTION = 9
+
+OPCODES = {
+    SYMBOL_PLUS: OP_ADD,
+    SYMBOL_MINUS: OP_SUB,
+    SYMBOL_MULTIPLY: OP_MUL,
+    SYMBOL_DIVIDE: OP_DIV,
+    SYMBOL_DEGREE: OP_POW
+}
+
+SYMBOLS = {opcode: symbol for symbol, opcode in OPCODES.items()}
+
+# how many values an opcode pops from the stack, every opcode pushes one
+POPS = {OP_CONST: 0, OP_VAR: 0, OP_NEG_VAR: 0, OP_ADD: 2, OP_SUB: 2, OP_MUL: 2, OP_DIV: 2, OP_POW: 2,
+        OP_FUNCTION: 1, OP_NEG_FUNCTION: 1}
+
+# binary format, little-endian: header (magic, version, functions, opcodes, constants), then the opcodes (1 byte each),
+# the arguments (uint32 each), the constants (float64 each) and the function names (length byte + UTF-8 each);
+# functions are stored by name, so a program survives a reordering of FUNCTIONS
+MAGIC = b'RPNP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBxHII')
+
+
+# RPN without the per-token tuples and strings: two parallel arrays (opcode, argument), a float constant pool
+# and a table of the used functions, built once per expression and shared by every evaluation
+class Program:
+    __slots__ = ('opcodes', 'args', 'constants', 'functions', 'names')
+
+    def __init__(self, opcodes: array, args: array, constants: array, functions: tuple, names: tuple):
+        self.opcodes = opcodes
+        self.args = args
+        self.constants = constants
+        self.functions = functions
+        self.names = names
+
+    @classmethod
+    def from_rpn(cls, rpn: List[Tuple[str, Token]]):
+        # raises the errors of the evaluation: EvaluatorException for unknown operations and functions,
+        # ValueError for a number float() doesn't understand
+        opcodes = array('B')
+        args = array('I')
+        constants = array('d')
+        constant_index = {}
+        names = []
+
+        for item in rpn:
+            arg = 0
+
+            if item[1] == Token.INTEGER:
+                opcode = OP_CONST
+
+                # keyed by the text and not by the value, so 0 and -0 stay apart
+                arg = constant_index.get(item[0])
+                if arg is None:
+                    arg = constant_index[item[0]] = len(constants)
+                    constants.append(float(item[0]))
+            elif item[1] == Token.VARIABLE:
+                opcode = OP_NEG_VAR if item[0].startswith(SYMBOL_MINUS) else OP_VAR
+            elif item[1] == Token.OPERATOR:
+                opcode = OPCODES.get(item[0])
+                if opcode is None:
+                    raise EvaluatorException(f'Unknown operation {item}')
+            elif item[1] == Token.FUNCTION:
+                name = item[0]
+                opcode = OP_FUNCTION
+
+                if name.startswith(SYMBOL_MINUS):
+                    name = name[1:]
+                    opcode = OP_NEG_FUNCTION
+
+                if name not in FUNCTIONS:
+                    raise EvaluatorException(f'Unknown function {name}')
+
+                if name not in names:
+                    names.append(name)
+                arg = names.index(name)
+            else:
+                raise EvaluatorException(f'Unexpected token {item}')
+
+            opcodes.append(opcode)
+            args.append(arg)
+
+        return cls(opcodes, args, constants, tuple(FUNCTIONS[name] for name in names), tuple(names))
+
+    @property
+    def is_function(self):
+        return OP_VAR in self.opcodes or OP_NEG_VAR in self.opcodes
+
+    def to_bytes(self) -> bytes:
+        args = array('I', self.args)
+        constants = array('d', self.constants)
+        if sys.byteorder == 'big':
+            args.byteswap()
+            constants.byteswap()
+
+        names = b''
+        for name in self.names:
+            encoded = name.encode()
+            names += bytes([len(encoded)]) + encoded
+
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, len(self.names), len(self.opcodes), len(self.constants))
+
+        return header + self.opcodes.tobytes() + args.tobytes() + constants.tobytes() + names
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, memoryview]):
+        data = memoryview(data)
+        if len(data) < HEADER.size:
+            raise ValueError('Not a program: too short')
+
+        magic, version, function_count, count, constant_count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f'Not a program: bad magic {magic!r}')
+        if version > FORMAT_VERSION:
+            raise ValueError(f'Unsupported program version {version}, the latest known is {FORMAT_VERSION}')
+
+        offset = HEADER.size
+        end = offset + count * 5 + constant_count * 8
+        if len(data) < end:
+            raise ValueError('Corrupted program: truncated')
+
+        opcodes = array('B')
+        opcodes.frombytes(data[offset:offset + count])
+        offset += count
+
+        args = array('I')
+        args.frombytes(data[offset:offset + count * 4])
+        offset += count * 4
+
+        constants = array('d')
+        constants.frombytes(data[offset:end])
+        offset = end
+
+        if sys.byteorder == 'big':
+            args.byteswap()
+            constants.byteswap()
+
+        names = []
+        for _ in range(function_count):
+            if offset >= len(data) or offset + 1 + data[offset] > len(data):
+                raise ValueError('Corrupted program: truncated')
+
+            names.append(bytes(data[offset + 1:offset + 1 + data[offset]]).decode())
+            offset += 1 + data[offset]
+
+        for name in names:
+            if name not in FUNCTIONS:
+                raise EvaluatorException(f'Unknown function {name}')
+
+        program = cls(opcodes, args, constants, tuple(FUNCTIONS[name] for name in names), tuple(names))
+        program._validate()
+
+        return program
+
+    def _validate(self):
+        # a broken file must not end up as an IndexError in the middle of an evaluation
+        depth = 0
+
+        for opcode, arg in zip(self.opcodes, self.args):
+            pops = POPS.get(opcode)
+
+            if pops is None:
+                raise ValueError(f'Corrupted program: unknown opcode {opcode}')
+            if opcode == OP_CONST and arg >= len(self.constants):
+                raise ValueError(f'Corrupted program: no constant {arg}')
+            if (opcode == OP_FUNCTION or opcode == OP_NEG_FUNCTION) and arg >= len(self.functions):
+                raise ValueError(f'Corrupted program: no function {arg}')
+            if depth < pops:
+                raise ValueError('Corrupted program: stack underflow')
+
+            depth += 1 - pops
+
+        if depth != 1:
+            raise ValueError(f'Corrupted program: {depth} values left on the stack')
+
+    def to_rpn(self) -> List[Tuple[str, Token]]:
+        # tokens for the code that works on them (Optimizer, Evaluator.compile), numbers are written with repr()
+        rpn = []
+
+        for opcode, arg in zip(self.opcodes, self.args):
+            if opcode == OP_CONST:
+                rpn.append((repr(self.constants[arg]), Token.INTEGER))
+            elif opcode == OP_VAR:
+                rpn.append((SYMBOL_VARIABLE, Token.VARIABLE))
+            elif opcode == OP_NEG_VAR:
+                rpn.append((SYMBOL_MINUS + SYMBOL_VARIABLE, Token.VARIABLE))
+            elif opcode == OP_FUNCTION:
+                rpn.append((self.names[arg], Token.FUNCTION))
+            elif opcode == OP_NEG_FUNCTION:
+                rpn.append((SYMBOL_MINUS + self.names[arg], Token.FUNCTION))
+            else:
+                rpn.append((SYMBOLS[opcode], Token.OPERATOR))
+
+        return rpn
+
+    def __reduce__(self):
+        # the co* functions are lambdas and can't be pickled, names can
+        return Program.from_bytes, (self.to_bytes(),)
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __repr__(self):
+        return f'Program({" ".join(item[0] for item in self.to_rpn())})'
@@ -1,6 +1,16 @@
+import functools
+import heapq
 import logging
-from typing import Callable
+import math
+import time
+from concurrent.futures import Executor, wait, FIRST_COMPLETED
+from typing import Callable, Union
 
+from .cancellation import CancellationToken
+from .exceptions import EvaluatorException
+from .metrics import get_metrics_sink
+from .program import Program
+from .tracing import get_trace_hook
 from .wrapper import EasyWrapper
 
 logger = logging.getLogger('Lexer')
@@ -8,41 +18,103 @@ logger = logging.getLogger('Lexer')
 EPSILON = 0.0001
 N = int(100000 / 4)
 MAX_STEPS = N
+CHUNK = 10000
+CHUNKS = 16
+# steps between cancellation checks in the scalar loops
+CHECK_INTERVAL = 1000
+# seconds between cancellation checks while waiting for worker processes
+POLL_INTERVAL = 0.05
 
+STATUS_CONVERGED = 'converged'
+STATUS_EXHAUSTED = 'exhausted'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
 
-def solve_using_secant(expr: EasyWrapper, a: float, b: float):
+
+class SolverResult:
+    def __init__(self, value, status: str, evaluations: int, iterations: int = 0, error: float = None):
+        self.value = value
+        self.status = status
+        self.evaluations = evaluations
+        self.iterations = iterations
+        self.error = error
+
+    def __repr__(self):
+        return f'SolverResult(value={self.value}, status={self.status}, evaluations={self.evaluations}, ' \
+               f'iterations={self.iterations}, error={self.error})'
+
+
+def _instrumented(name: str):
+    # reports the time, the evaluations and the iterations of every call to the metrics sink, if there is one
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sink = get_metrics_sink()
+            if sink is None:
+                return func(*args, **kwargs)
+
+            started = time.perf_counter()
+            res = func(*args, **kwargs)
+
+            sink(f'{name}.seconds', time.perf_counter() - started)
+            sink(f'{name}.evaluations', res.evaluations)
+            sink(f'{name}.iterations', res.iterations)
+
+            return res
+
+        return wrapper
+
+    return decorator
+
+
+@_instrumented('secant')
+def solve_using_secant(expr: EasyWrapper, a: float, b: float, token: CancellationToken = None):
     step = 1
+    trace = get_trace_hook()
 
-    while 1:
-        a1 = expr(a)
-        b1 = expr(b)
+    # expr(a) of the next step is always expr(b) of the current one
+    a1 = expr(a)
+    b1 = expr(b)
+    evaluations = 2
 
+    while 1:
         if a1 == b1 or a1 is None or b1 is None:
             logger.error('Division by zero')
-            return None
+            return SolverResult(None, STATUS_FAILED, evaluations, step - 1)
 
         x = a - (b - a) * a1 / (b1 - a1)
-        logger.debug(f'{step = }, {x = }')
+        if trace is not None:
+            trace('Solver', 'secant_step', step=step, x=x)
 
         a = b
         b = x
 
         r = expr(x)
+        evaluations += 1
         if r is None:
-            return None
+            return SolverResult(None, STATUS_FAILED, evaluations, step)
 
         if abs(r) <= EPSILON:
             break
 
+        # the last approximation is the partial result
         if step >= MAX_STEPS:
-            return None
+            return SolverResult(x, STATUS_EXHAUSTED, evaluations, step, abs(r))
+        if token is not None and token.cancelled:
+            return SolverResult(x, STATUS_CANCELLED, evaluations, step, abs(r))
 
         step += 1
+        a1, b1 = b1, r
+
+    if a <= x <= b:
+        return SolverResult(x, STATUS_CONVERGED, evaluations, step, abs(r))
 
-    return x if a <= x <= b else None
+    return SolverResult(None, STATUS_FAILED, evaluations, step, abs(r))
 
 
-def integral_using_simpson(expr: EasyWrapper, a: float, b: float, callback: Callable = None):
+@_instrumented('simpson')
+def integral_using_simpson(expr: EasyWrapper, a: float, b: float, callback: Callable = None,
+                           token: CancellationToken = None):
     # powered by Johny
     # adopted by me <3
     dx = (b - a) / N
@@ -55,8 +127,627 @@ def integral_using_simpson(expr: EasyWrapper, a: float, b: float, callback: Call
         except TypeError:
             pass
 
-        # this method can be slow, so give some feedback on operation progress
-        if i % 10000 == 0 and callback is not None:
+        if i % CHECK_INTERVAL == 0:
+            # this method can be slow, so give some feedback on operation progress
+            if i % 10000 == 0 and callback is not None:
+                callback(i, N)
+
+            # the integral over [a, a + (i + 1) * dx] is the partial result
+            if token is not None and token.cancelled:
+                return SolverResult(res, STATUS_CANCELLED, 3 * (i + 1), i + 1)
+
+    return SolverResult(res, STATUS_CONVERGED, 3 * N, N)
+
+
+@_instrumented('brent')
+def solve_using_brent(expr: EasyWrapper, a: float, b: float, xtol: float = 1e-12, rtol: float = 4 * 2.2e-16,
+                      max_steps: int = 100, token: CancellationToken = None):
+    # Brent's method: inverse quadratic interpolation / secant steps inside a sign-change bracket,
+    # falling back to bisection, so the root never escapes [a, b]
+    x_pre, x_cur = a, b
+    f_pre, f_cur = expr(a), expr(b)
+    evaluations = 2
+
+    if f_pre is None or f_cur is None or f_pre * f_cur > 0:
+        logger.debug('No sign change on the interval')
+        return SolverResult(None, STATUS_FAILED, evaluations)
+
+    if f_pre == 0:
+        return SolverResult(x_pre, STATUS_CONVERGED, evaluations, error=0.0)
+    if f_cur == 0:
+        return SolverResult(x_cur, STATUS_CONVERGED, evaluations, error=0.0)
+
+    x_blk = f_blk = 0.0
+    s_pre = s_cur = 0.0
+    trace = get_trace_hook()
+
+    for step in range(1, max_steps + 1):
+        if f_pre * f_cur < 0:
+            x_blk, f_blk = x_pre, f_pre
+            s_pre = s_cur = x_cur - x_pre
+
+        if abs(f_blk) < abs(f_cur):
+            x_pre, x_cur, x_blk = x_cur, x_blk, x_cur
+            f_pre, f_cur, f_blk = f_cur, f_blk, f_cur
+
+        delta = (xtol + rtol * abs(x_cur)) / 2
+        s_bis = (x_blk - x_cur) / 2
+
+        if f_cur == 0 or abs(s_bis) < delta:
+            return SolverResult(x_cur, STATUS_CONVERGED, evaluations, step, abs(s_bis))
+
+        if token is not None and token.cancelled:
+            return SolverResult(x_cur, STATUS_CANCELLED, evaluations, step - 1, abs(s_bis))
+
+        if abs(s_pre) > delta and abs(f_cur) < abs(f_pre):
+            if x_pre == x_blk:
+                # secant
+                s_try = -f_cur * (x_cur - x_pre) / (f_cur - f_pre)
+            else:
+                # inverse quadratic interpolation
+                d_pre = (f_pre - f_cur) / (x_pre - x_cur)
+                d_blk = (f_blk - f_cur) / (x_blk - x_cur)
+                s_try = -f_cur * (f_blk * d_blk - f_pre * d_pre) / (d_blk * d_pre * (f_blk - f_pre))
+
+            if 2 * abs(s_try) < min(abs(s_pre), 3 * abs(s_bis) - delta):
+                s_pre, s_cur = s_cur, s_try
+            else:
+                s_pre = s_cur = s_bis
+        else:
+            s_pre = s_cur = s_bis
+
+        x_pre, f_pre = x_cur, f_cur
+
+        if abs(s_cur) > delta:
+            x_cur += s_cur
+        else:
+            x_cur += delta if s_bis > 0 else -delta
+
+        f_cur = expr(x_cur)
+        evaluations += 1
+        if trace is not None:
+            trace('Solver', 'brent_step', step=step, x=x_cur)
+
+        if f_cur is None:
+            return SolverResult(None, STATUS_FAILED, evaluations, step)
+
+    return SolverResult(x_cur, STATUS_EXHAUSTED, evaluations, max_steps, abs(x_blk - x_cur) / 2)
+
+
+@_instrumented('newton')
+def solve_using_newton(expr: EasyWrapper, a: float, b: float, halley: bool = False, xtol: float = 1e-12,
+                       rtol: float = 4 * 2.2e-16, ftol: float = EPSILON, max_steps: int = 100,
+                       token: CancellationToken = None):
+    # Newton's method (Halley's with halley=True) on the symbolic derivatives, started in the middle of [a, b];
+    # with a sign change on [a, b] it keeps the bracket and bisects whenever a step leaves it,
+    # without one a step out of [a, b] is a failure
+    try:
+        derivative = expr.derivative()
+        second = derivative.derivative() if halley else None
+    except EvaluatorException as err:
+        logger.error(str(err))
+        return SolverResult(None, STATUS_FAILED, 0)
+
+    lo, hi = min(a, b), max(a, b)
+    f_lo, f_hi = expr(lo), expr(hi)
+    evaluations = 2
+
+    if f_lo == 0:
+        return SolverResult(lo, STATUS_CONVERGED, evaluations, error=0.0)
+    if f_hi == 0:
+        return SolverResult(hi, STATUS_CONVERGED, evaluations, error=0.0)
+
+    bracketed = f_lo is not None and f_hi is not None and f_lo * f_hi < 0
+    x = (lo + hi) / 2
+    step_size = previous = hi - lo
+    trace = get_trace_hook()
+
+    for step in range(1, max_steps + 1):
+        if token is not None and token.cancelled:
+            return SolverResult(x, STATUS_CANCELLED, evaluations, step - 1, abs(step_size))
+
+        f = expr(x)
+        df = derivative(x)
+        evaluations += 2
+
+        if f is None:
+            return SolverResult(None, STATUS_FAILED, evaluations, step)
+        if f == 0:
+            return SolverResult(x, STATUS_CONVERGED, evaluations, step, 0.0)
+
+        if bracketed:
+            if (f < 0) == (f_lo < 0):
+                lo, f_lo = x, f
+            else:
+                hi = x
+
+        step_size = None
+        if df:
+            step_size = f / df
+
+            if second is not None:
+                ddf = second(x)
+                evaluations += 1
+
+                # x - 2 f f' / (2 f'^2 - f f'')
+                denominator = 1 - step_size * ddf / (2 * df) if ddf is not None else 0
+                if denominator:
+                    step_size /= denominator
+
+        if step_size is None or not lo <= x - step_size <= hi:
+            if not bracketed:
+                return SolverResult(None, STATUS_FAILED, evaluations, step)
+
+            step_size = x - (lo + hi) / 2
+        elif bracketed and abs(2 * step_size) > previous:
+            # far from the root Newton can crawl (exp(x) - 1000 from x = 50), bisection halves the bracket at least
+            step_size = x - (lo + hi) / 2
+
+        previous = abs(step_size)
+
+        x -= step_size
+        if trace is not None:
+            trace('Solver', 'newton_step', step=step, x=x)
+
+        if abs(step_size) <= xtol + rtol * abs(x) or (bracketed and hi - lo <= xtol + rtol * abs(x)):
+            # a bracket also collapses onto the sign change of a pole (1/x, tan(x)), that is no root
+            f = expr(x)
+            evaluations += 1
+
+            if f is None or abs(f) > ftol:
+                return SolverResult(None, STATUS_FAILED, evaluations, step)
+
+            return SolverResult(x, STATUS_CONVERGED, evaluations, step, abs(step_size))
+
+    return SolverResult(x, STATUS_EXHAUSTED, evaluations, max_steps, abs(step_size))
+
+
+@_instrumented('all_roots')
+def find_all_roots(expr: EasyWrapper, a: float, b: float, samples: int = 1000, xtol: float = 1e-12,
+                   ftol: float = EPSILON, max_steps: int = 100, token: CancellationToken = None):
+    try:
+        import numpy as np
+    except ImportError:
+        return _find_all_roots_scalar(expr, a, b, samples, xtol, ftol, max_steps, token)
+
+    # the refinement narrows [lo, hi] until hi - lo <= xtol, which a reversed interval already is
+    a, b = min(a, b), max(a, b)
+
+    # sample the whole interval in one batch
+    xs = np.linspace(a, b, samples + 1)
+    with np.errstate(all='ignore'):
+        values = expr(xs)
+    evaluations = len(xs)
+
+    # a run of zero samples (x - x, or f vanishing on a part of the interval) is one root, its first sample
+    zeros = values == 0
+    roots = list(xs[zeros & ~np.concatenate(([False], zeros[:-1]))])
+
+    finite = np.isfinite(values)
+    left, right = values[:-1], values[1:]
+    brackets = np.flatnonzero(finite[:-1] & finite[1:] & (left * right < 0))
+
+    # |f| dips without a sign change: possible roots of even multiplicity
+    inner = values[1:-1]
+    minima = 1 + np.flatnonzero(finite[:-2] & finite[1:-1] & finite[2:] & (inner != 0) &
+                                (left[:-1] * inner > 0) & (inner * right[1:] > 0) &
+                                (np.abs(inner) < np.abs(left[:-1])) & (np.abs(inner) <= np.abs(right[1:])))
+
+    steps_minima = 0
+
+    # a cancelled refinement stops early with less precise roots, the minima are skipped then
+    with np.errstate(all='ignore'):
+        found, evals, steps_bracket = _refine_brackets(expr, xs[brackets], xs[brackets + 1], values[brackets],
+                                                       values[brackets + 1], xtol, max_steps, np, token)
+        roots.extend(found)
+        evaluations += evals
+
+        cancelled = token is not None and token.cancelled
+        if not cancelled:
+            found, evals, steps_minima = _refine_minima(expr, xs[minima - 1], xs[minima + 1], xtol, ftol, max_steps,
+                                                        np, token)
+            roots.extend(found)
+            evaluations += evals
+
+            cancelled = token is not None and token.cancelled
+
+    roots.sort()
+
+    res = []
+    for root in roots:
+        if not res or root - res[-1] > 2 * xtol:
+            res.append(float(root))
+
+    return SolverResult(res, STATUS_CANCELLED if cancelled else STATUS_CONVERGED, evaluations,
+                        max(steps_bracket, steps_minima))
+
+
+def _find_all_roots_scalar(expr: EasyWrapper, a: float, b: float, samples: int, xtol: float, ftol: float,
+                           max_steps: int, token: CancellationToken = None):
+    # the same search without numpy: one evaluation per sample, Brent's method per bracket
+    # and a golden-section search per dip of |f|
+    a, b = min(a, b), max(a, b)
+    xs = [a + (b - a) * i / samples for i in range(samples + 1)]
+    values = [expr(x) for x in xs]
+    evaluations = len(xs)
+
+    roots = [x for i, x in enumerate(xs) if values[i] == 0 and (i == 0 or values[i - 1] != 0)]
+    steps = 0
+    cancelled = False
+
+    for i in range(samples):
+        if token is not None and token.cancelled:
+            cancelled = True
+            break
+
+        left, right = values[i], values[i + 1]
+        if left is None or right is None or left * right >= 0:
+            continue
+
+        # the metrics are reported for find_all_roots, not for every bracket
+        res = solve_using_brent.__wrapped__(expr, xs[i], xs[i + 1], xtol=xtol, max_steps=max_steps)
+        evaluations += res.evaluations
+        steps = max(steps, res.iterations)
+
+        if res.value is not None:
+            value = expr(res.value)
+            evaluations += 1
+
+            # a pole also changes sign, but |f| grows towards it instead of vanishing
+            if value is not None and abs(value) <= min(abs(left), abs(right)):
+                roots.append(res.value)
+
+    for i in range(1, samples):
+        if cancelled or token is not None and token.cancelled:
+            cancelled = True
+            break
+
+        left, inner, right = values[i - 1], values[i], values[i + 1]
+        if left is None or inner is None or right is None or inner == 0:
+            continue
+
+        if left * inner > 0 and inner * right > 0 and abs(inner) < abs(left) and abs(inner) <= abs(right):
+            root, value, evals, steps_minimum = _golden_minimum(expr, xs[i - 1], xs[i + 1], xtol, max_steps, token)
+            evaluations += evals
+            steps = max(steps, steps_minimum)
+
+            if value <= ftol:
+                roots.append(root)
+
+    roots.sort()
+
+    res = []
+    for root in roots:
+        if not res or root - res[-1] > 2 * xtol:
+            res.append(float(root))
+
+    return SolverResult(res, STATUS_CANCELLED if cancelled else STATUS_CONVERGED, evaluations, steps)
+
+
+def _golden_minimum(expr: EasyWrapper, lo: float, hi: float, xtol: float, max_steps: int,
+                    token: CancellationToken = None):
+    # the minimum of |f| on [lo, hi], undefined points count as infinitely far from a root
+    def distance(x):
+        value = expr(x)
+        return math.inf if value is None else abs(value)
+
+    ratio = (math.sqrt(5) - 1) / 2
+    x1 = hi - ratio * (hi - lo)
+    x2 = lo + ratio * (hi - lo)
+    f1 = distance(x1)
+    f2 = distance(x2)
+    evaluations = 2
+    steps = 0
+
+    while steps < max_steps and hi - lo > xtol:
+        if token is not None and token.cancelled:
+            break
+
+        steps += 1
+
+        if f1 < f2:
+            hi, x2, f2 = x2, x1, f1
+            x1 = hi - ratio * (hi - lo)
+            f1 = distance(x1)
+        else:
+            lo, x1, f1 = x1, x2, f2
+            x2 = lo + ratio * (hi - lo)
+            f2 = distance(x2)
+
+        evaluations += 1
+
+    return (x1, f1, evaluations, steps) if f1 < f2 else (x2, f2, evaluations, steps)
+
+
+def _refine_brackets(expr: EasyWrapper, lo, hi, f_lo, f_hi, xtol: float, max_steps: int, np,
+                     token: CancellationToken = None):
+    # all brackets are bisected at once, one batched evaluation per step
+    evaluations = 0
+    steps = 0
+    bound = np.minimum(np.abs(f_lo), np.abs(f_hi))
+
+    while len(lo) and steps < max_steps and np.max(hi - lo) > xtol:
+        if token is not None and token.cancelled:
+            break
+
+        mid = (lo + hi) / 2
+        f_mid = expr(mid)
+        evaluations += len(mid)
+        steps += 1
+
+        same = np.sign(f_mid) == np.sign(f_lo)
+        lo = np.where(same, mid, lo)
+        f_lo = np.where(same, f_mid, f_lo)
+        hi = np.where(same, hi, mid)
+
+    if not len(lo):
+        return [], evaluations, steps
+
+    roots = (lo + hi) / 2
+    f_roots = expr(roots)
+    evaluations += len(roots)
+
+    # a pole also changes sign, but |f| grows towards it instead of vanishing
+    return list(roots[np.abs(f_roots) <= bound]), evaluations, steps
+
+
+def _refine_minima(expr: EasyWrapper, lo, hi, xtol: float, ftol: float, max_steps: int, np,
+                   token: CancellationToken = None):
+    # golden-section search for the minimum of |f| on every candidate at once
+    evaluations = 0
+    steps = 0
+
+    if not len(lo):
+        return [], evaluations, steps
+
+    ratio = (math.sqrt(5) - 1) / 2
+    x1 = hi - ratio * (hi - lo)
+    x2 = lo + ratio * (hi - lo)
+    f1 = np.abs(expr(x1))
+    f2 = np.abs(expr(x2))
+    evaluations += 2 * len(lo)
+
+    while steps < max_steps and np.max(hi - lo) > xtol:
+        if token is not None and token.cancelled:
+            break
+
+        steps += 1
+
+        left = f1 < f2
+
+        hi = np.where(left, x2, hi)
+        lo = np.where(left, lo, x1)
+
+        new_x = np.where(left, hi - ratio * (hi - lo), lo + ratio * (hi - lo))
+        new_f = np.abs(expr(new_x))
+        evaluations += len(new_x)
+
+        x2, f2, x1, f1 = (np.where(left, x1, new_x), np.where(left, f1, new_f),
+                          np.where(left, new_x, x2), np.where(left, new_f, f2))
+
+    roots = np.where(f1 < f2, x1, x2)
+    f_roots = np.minimum(f1, f2)
+
+    return list(roots[f_roots <= ftol]), evaluations, steps
+
+
+def _simpson_batched(expr: EasyWrapper, a: float, dx: float, start: int, stop: int, callback: Callable = None,
+                     token: CancellationToken = None):
+    import numpy as np
+
+    # same rule as above, but the nodes are evaluated in batches and each node only once:
+    # node 2i is a + i * dx, node 2i + 1 is the midpoint of the i-th sub-interval
+    # returns the integral and the end of the integrated part, which is stop unless cancelled
+    res = 0
+    last = None
+
+    for i in range(start, stop, CHUNK):
+        if callback is not None:
             callback(i, N)
 
-    return res
+        if token is not None and token.cancelled:
+            return float(res), i
+
+        j = min(i + CHUNK, stop)
+
+        if last is None:
+            values = expr(a + np.arange(2 * i, 2 * j + 1) * (dx / 2))
+        else:
+            values = np.concatenate(([last], expr(a + np.arange(2 * i + 1, 2 * j + 1) * (dx / 2))))
+
+        last = values[-1]
+
+        # sub-intervals touching an undefined point are skipped, as in the scalar version
+        res += (dx / 6) * np.nansum(values[0:-1:2] + 4 * values[1::2] + values[2::2])
+
+    return float(res), stop
+
+
+@_instrumented('simpson_batched')
+def integral_using_simpson_batched(expr: EasyWrapper, a: float, b: float, callback: Callable = None,
+                                   token: CancellationToken = None):
+    try:
+        import numpy
+    except ImportError:
+        return integral_using_simpson(expr, a, b, callback, token)
+
+    res, done = _simpson_batched(expr, a, (b - a) / N, 0, N, callback, token)
+
+    return SolverResult(res, STATUS_CONVERGED if done == N else STATUS_CANCELLED, 2 * done + 1 if done else 0, done)
+
+
+def _integrate_chunk(source: Union[str, bytes], a: float, dx: float, start: int, stop: int):
+    # runs in a worker process, the expression is rebuilt from its source (or its program) instead of being pickled
+    if isinstance(source, bytes):
+        expr = EasyWrapper.from_program(Program.from_bytes(source))
+    else:
+        expr = EasyWrapper.from_string(source)
+
+    return _simpson_chunk(expr, a, dx, start, stop)
+
+
+def _simpson_chunk(expr: EasyWrapper, a: float, dx: float, start: int, stop: int):
+    # sub-intervals [start, stop) of the fixed-step rule, returns the integral and the number of evaluations
+    try:
+        import numpy
+    except ImportError:
+        res = 0
+
+        for i in range(start, stop):
+            try:
+                res += (dx / 6) * (expr(a + i * dx) + 4 * expr((2 * a + (2 * i + 1) * dx) / 2) +
+                                   expr(a + (i + 1) * dx))
+            except TypeError:
+                pass
+
+        return res, 3 * (stop - start)
+
+    return _simpson_batched(expr, a, dx, start, stop)[0], 2 * (stop - start) + 1
+
+
+@_instrumented('simpson_parallel')
+def integral_using_simpson_parallel(expr: Union[EasyWrapper, str], a: float, b: float, callback: Callable = None,
+                                    jobs: int = None, chunks: int = CHUNKS, executor: Executor = None,
+                                    token: CancellationToken = None):
+    if isinstance(expr, str):
+        expr = EasyWrapper.from_string(expr)
+
+    # checked before anything is submitted, a worker would only fail on it later
+    if not expr.valid:
+        raise expr.err
+
+    # wrappers made by from_program() have no source, they are sent as a program
+    source = expr.source or expr.converter_result.program.to_bytes()
+    dx = (b - a) / N
+
+    # chunking doesn't depend on the number of workers, so results are reproducible everywhere
+    bounds = [N * k // chunks for k in range(chunks + 1)]
+
+    own_executor = executor is None
+    if own_executor:
+        # multiprocessing is heavy to import, so it's only loaded when needed
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(jobs)
+
+    status = STATUS_CONVERGED
+
+    try:
+        futures = {executor.submit(_integrate_chunk, source, a, dx, start, stop): stop - start
+                   for start, stop in zip(bounds, bounds[1:])}
+
+        done = 0
+        completed = set()
+        pending = set(futures)
+
+        while pending:
+            # the workers can't see the token, so it's checked here while waiting for them
+            finished, pending = wait(pending, timeout=None if token is None else POLL_INTERVAL,
+                                     return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                done += futures[future]
+                completed.add(future)
+
+                if callback is not None:
+                    callback(done, N)
+
+            if pending and token is not None and token.cancelled:
+                for future in pending:
+                    future.cancel()
+
+                status = STATUS_CANCELLED
+                break
+
+        # summed in the chunk order, not in the completion order, chunks that didn't finish are left out
+        results = [future.result() for future in futures if future in completed]
+        res = math.fsum(value for value, _ in results)
+        evaluations = sum(count for _, count in results)
+    finally:
+        if own_executor:
+            executor.shutdown(wait=status != STATUS_CANCELLED, cancel_futures=True)
+
+    return SolverResult(res, status, evaluations, done)
+
+
+def _make_segment(expr: EasyWrapper, a: float, b: float, fa, fm, fb, min_width: float):
+    m = (a + b) / 2
+    flm = expr((a + m) / 2)
+    frm = expr((m + b) / 2)
+
+    values = (fa, flm, fm, frm, fb)
+
+    if None in values:
+        # partially undefined: keep splitting towards the domain boundary until the piece is negligible,
+        # then skip it (as the fixed-step version does), completely undefined pieces are skipped right away
+        value = 0.0
+        err = math.inf if b - a > min_width and values.count(None) != len(values) else 0.0
+    else:
+        whole = (b - a) / 6 * (fa + 4 * fm + fb)
+        halves = (b - a) / 12 * (fa + 4 * flm + 2 * fm + 4 * frm + fb)
+
+        # Richardson extrapolation of two Simpson estimates
+        value = halves + (halves - whole) / 15
+        err = abs(halves - whole) / 15
+
+    return a, b, fa, flm, fm, frm, fb, value, err
+
+
+@_instrumented('adaptive_simpson')
+def integral_using_adaptive_simpson(expr: EasyWrapper, a: float, b: float, rtol: float = 1e-8, atol: float = 1e-12,
+                                    max_evaluations: int = MAX_STEPS, token: CancellationToken = None):
+    # globally adaptive: always split the segment with the worst local error estimate
+    sign = 1
+    if b < a:
+        a, b = b, a
+        sign = -1
+
+    min_width = (b - a) * 2 ** -40
+
+    segment = _make_segment(expr, a, b, expr(a), expr((a + b) / 2), expr(b), min_width)
+    evaluations = 5
+    iterations = 0
+    counter = 0
+
+    heap = [(-segment[8], counter, segment)]
+    value = segment[7]
+    error = 0.0 if math.isinf(segment[8]) else segment[8]
+    undefined = 1 if math.isinf(segment[8]) else 0
+
+    status = STATUS_CONVERGED
+
+    while undefined or error > max(atol, rtol * abs(value)):
+        if evaluations + 4 > max_evaluations:
+            status = STATUS_EXHAUSTED
+            break
+        if token is not None and token.cancelled:
+            status = STATUS_CANCELLED
+            break
+
+        _, _, segment = heapq.heappop(heap)
+        sa, sb, fa, flm, fm, frm, fb, old_value, old_err = segment
+        sm = (sa + sb) / 2
+
+        left = _make_segment(expr, sa, sm, fa, flm, fm, min_width)
+        right = _make_segment(expr, sm, sb, fm, frm, fb, min_width)
+        evaluations += 4
+        iterations += 1
+
+        value += left[7] + right[7] - old_value
+
+        for seg_err, sign_ in ((old_err, -1), (left[8], 1), (right[8], 1)):
+            if math.isinf(seg_err):
+                undefined += sign_
+            else:
+                error += sign_ * seg_err
+
+        for item in (left, right):
+            counter += 1
+            heapq.heappush(heap, (-item[8], counter, item))
+
+    # the running sums drift, so recompute them exactly
+    value = math.fsum(item[2][7] for item in heap)
+    error = math.inf if undefined else math.fsum(item[2][8] for item in heap)
+    logger.debug(f'{evaluations = }, {iterations = }, {error = }')
+
+    return SolverResult(sign * value, status, evaluations, iterations, error)
@@ -0,0 +1,90 @@
+import mmap
+import os
+from array import array
+from itertools import islice
+from typing import Iterable, Iterator, BinaryIO, TextIO, Union
+
+from .wrapper import EasyWrapper
+
+# values per chunk, peak memory is bounded by this and not by the input size
+CHUNK_SIZE = 1 << 16
+
+
+def iter_chunks(xs: Iterable[float], chunk_size: int = CHUNK_SIZE) -> Iterator[array]:
+    xs = iter(xs)
+
+    while True:
+        chunk = array('d', islice(xs, chunk_size))
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def stream_eval(expr: EasyWrapper, xs: Iterable[float], chunk_size: int = CHUNK_SIZE):
+    for chunk in iter_chunks(xs, chunk_size):
+        yield expr.eval_many(chunk)
+
+
+def _read_text(file: TextIO, column: int, delimiter: str):
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+
+        if column is not None:
+            line = line.split(delimiter)[column]
+
+        yield float(line)
+
+
+def stream_text_file(expr: EasyWrapper, path: Union[str, os.PathLike], chunk_size: int = CHUNK_SIZE,
+                     column: int = None, delimiter: str = ','):
+    # one value per line, or one column of a CSV file
+    with open(path) as file:
+        yield from stream_eval(expr, _read_text(file, column, delimiter), chunk_size)
+
+
+def stream_binary_file(expr: EasyWrapper, path: Union[str, os.PathLike], chunk_size: int = CHUNK_SIZE):
+    # raw native-endian float64 values, memory-mapped and evaluated without copying the input
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size % 8:
+            raise ValueError(f'{path} is not a float64 file, size {size} is not a multiple of 8')
+        if not size:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                memoryview(mapped) as view, view.cast('d') as doubles:
+            for start in range(0, len(doubles), chunk_size):
+                with doubles[start:start + chunk_size] as chunk:
+                    yield expr.eval_many(_from_buffer(chunk))
+
+
+def _from_buffer(chunk: memoryview):
+    try:
+        import numpy as np
+    except ImportError:
+        return array('d', chunk)
+
+    return np.frombuffer(chunk, dtype=float)
+
+
+def write_text(results: Iterable, file: TextIO):
+    count = 0
+
+    for chunk in results:
+        file.writelines(f'{value!r}\n' for value in map(float, chunk))
+        count += len(chunk)
+
+    return count
+
+
+def write_binary(results: Iterable, file: BinaryIO):
+    count = 0
+
+    for chunk in results:
+        file.write(memoryview(chunk).cast('B'))
+        count += len(chunk)
+
+    return count
@@ -4,6 +4,7 @@ from typing import Tuple, List
 
 from .consts import *
 from .lexer import LexerResult
+from .tracing import get_trace_hook
 
 logger = logging.getLogger('Tokenizer')
 
@@ -18,6 +19,8 @@ class Token(Enum):
 
 
 class TokenizerResult:
+    __slots__ = ('result', 'lexer_result')
+
     def __init__(self, result: List[Tuple[str, Token]], lexer_result: LexerResult):
         self.result = result
         self.lexer_result = lexer_result
@@ -36,25 +39,31 @@ class Tokenizer:
         assert lexer_result
 
         result: List[Tuple[str, Token]] = []
+        trace = get_trace_hook()
 
         for item in lexer_result.result:
-            if item in OPERATORS:
-                token = Token.OPERATOR
-            elif item == SYMBOL_BRACKET_OPEN:
-                token = Token.BRACKET_OPEN
-            elif item == SYMBOL_BRACKET_CLOSE:
-                token = Token.BRACKET_CLOSE
-            else:
-                abs_item = item.strip('-')
-
-                if abs_item == SYMBOL_VARIABLE:
-                    token = Token.VARIABLE
-                elif all(ch in ALPHABET for ch in abs_item):
-                    token = Token.FUNCTION
-                else:
-                    token = Token.INTEGER
-
-            logger.debug(f'"{item}" is a(n) {token.name}')
+            token = self.classify(item)
+
+            if trace is not None:
+                trace('Tokenizer', 'token', lexeme=item, token=token.name)
+
             result.append((item, token))
 
         return TokenizerResult(result, lexer_result)
+
+    def classify(self, item: str):
+        if item in OPERATORS:
+            return Token.OPERATOR
+        if item == SYMBOL_BRACKET_OPEN:
+            return Token.BRACKET_OPEN
+        if item == SYMBOL_BRACKET_CLOSE:
+            return Token.BRACKET_CLOSE
+
+        abs_item = item.strip('-')
+
+        if abs_item == SYMBOL_VARIABLE:
+            return Token.VARIABLE
+        if all(ch in ALPHABET for ch in abs_item):
+            return Token.FUNCTION
+
+        return Token.INTEGER
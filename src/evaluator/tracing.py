@@ -0,0 +1,48 @@
+import logging
+
+# hot loops (lexer, tokenizer, converter, evaluator, solvers) fetch the hook once per call
+# and skip tracing entirely while it is None, so tracing costs nothing unless enabled
+_hook = None
+
+
+def get_trace_hook():
+    return _hook
+
+
+def set_trace_hook(hook):
+    global _hook
+
+    previous = _hook
+    _hook = hook
+
+    return previous
+
+
+def log_trace_hook(stage: str, event: str, **data):
+    # the old behaviour: every step goes to the debug log of the stage
+    logger = logging.getLogger(stage)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'{event}: ' + ', '.join(f'{k} = {v!r}' for k, v in data.items()))
+
+
+class TraceRecorder:
+    def __init__(self, stages=None):
+        self.stages = set(stages) if stages else None
+        self.events = []
+
+        self._previous = None
+
+    def __call__(self, stage: str, event: str, **data):
+        if self.stages is None or stage in self.stages:
+            self.events.append((stage, event, data))
+
+    def __enter__(self):
+        self._previous = set_trace_hook(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        set_trace_hook(self._previous)
+
+    def __repr__(self):
+        return f'TraceRecorder(events={len(self.events)})'
@@ -0,0 +1,128 @@
+import math
+import sys
+
+from .consts import FUNCTIONS, SYMBOL_PLUS, SYMBOL_MINUS, SYMBOL_MULTIPLY, SYMBOL_DIVIDE, SYMBOL_DEGREE
+
+# math name -> numpy name, everything else falls back to the scalar function
+UFUNC_NAMES = {
+    'acos': 'arccos',
+    'acosh': 'arccosh',
+    'asin': 'arcsin',
+    'asinh': 'arcsinh',
+    'atan': 'arctan',
+    'atanh': 'arctanh',
+    'cbrt': 'cbrt',
+    'ceil': 'ceil',
+    'cos': 'cos',
+    'cosh': 'cosh',
+    'degrees': 'degrees',
+    'exp': 'exp',
+    'exp2': 'exp2',
+    'expm1': 'expm1',
+    'fabs': 'fabs',
+    'floor': 'floor',
+    'isfinite': 'isfinite',
+    'isinf': 'isinf',
+    'isnan': 'isnan',
+    'log': 'log',
+    'log10': 'log10',
+    'log1p': 'log1p',
+    'log2': 'log2',
+    'radians': 'radians',
+    'sin': 'sin',
+    'sinh': 'sinh',
+    'sqrt': 'sqrt',
+    'tan': 'tan',
+    'tanh': 'tanh',
+    'trunc': 'trunc',
+    'ln': 'log',
+    'lb': 'log2',
+    'lg': 'log10',
+    'log_two': 'log2',
+    'log_ten': 'log10'
+}
+
+_cache = {}
+
+
+def numpy():
+    import numpy as np
+
+    return np
+
+
+def is_array(x):
+    # numpy is never imported just to check the argument type
+    np = sys.modules.get('numpy')
+
+    return np is not None and isinstance(x, np.ndarray)
+
+
+def mask_overflow(np, res, *args):
+    # finite arguments giving an infinite result is a domain/division error for the scalar path
+    bad = np.isinf(res)
+    for arg in args:
+        bad &= np.isfinite(arg)
+
+    return np.where(bad, np.nan, res)
+
+
+def apply_operator(np, operator: str, left, right):
+    if operator == SYMBOL_PLUS:
+        return left + right
+    if operator == SYMBOL_MINUS:
+        return left - right
+    if operator == SYMBOL_MULTIPLY:
+        return left * right
+    if operator == SYMBOL_DIVIDE:
+        return np.where(right == 0, np.nan, left / np.where(right == 0, 1.0, right))
+    if operator == SYMBOL_DEGREE:
+        return mask_overflow(np, np.power(left, right), left, right)
+
+    return None
+
+
+def get_ufunc(name: str):
+    func = _cache.get(name)
+    if func is None:
+        func = _cache[name] = _build_ufunc(name)
+
+    return func
+
+
+def _build_ufunc(name: str):
+    np = numpy()
+
+    if name in UFUNC_NAMES:
+        ufunc = getattr(np, UFUNC_NAMES[name])
+
+        def func(value):
+            return mask_overflow(np, ufunc(value).astype(float), value)
+
+        return func
+
+    if name.startswith('co') and name[2:] in UFUNC_NAMES:
+        base = get_ufunc(name[2:])
+
+        def func(value):
+            res = base(value)
+            return np.where(res == 0, np.nan, 1.0 / np.where(res == 0, 1.0, res))
+
+        return func
+
+    scalar = FUNCTIONS.get(name)
+    if scalar is None:
+        return None
+
+    def safe_scalar(value):
+        try:
+            return float(scalar(value))
+        except (ZeroDivisionError, ValueError, OverflowError, TypeError):
+            return math.nan
+
+    vectorized = np.frompyfunc(safe_scalar, 1, 1)
+
+    def func(value):
+        return np.asarray(vectorized(value), dtype=float)
+
+    return func
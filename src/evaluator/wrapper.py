@@ -1,19 +1,48 @@
-from .converter import Converter
+import copy
+import math
+from array import array
+from typing import Iterable, Union
+
+from .cache import LRUCache, BoundedCache, POLICY_LRU
+from .converter import Converter, ConverterResult
+from .derivative import Differentiator
 from .evaluator import Evaluator, FUNCTIONS
 from .exceptions import LexerException
-from .lexer import Lexer
-from .tokenizer import Tokenizer, Token
+from .fast_lexer import FastLexer
+from .lexer import LexerResult
+from .metrics import get_metrics_sink, timer
+from .optimizer import Optimizer
+from .program import Program
+from .tracing import get_trace_hook
+from .tokenizer import Token
+from .ufuncs import is_array, numpy
 
 
 class EasyWrapper:
+    # parsed expressions shared by from_string(), keyed by the source string
+    cache = LRUCache(4096)
+
+    # the stages keep no state between calls, so every wrapper uses the same ones
+    lexer = FastLexer()
+    converter = Converter()
+    optimizer = Optimizer()
+    evaluator = Evaluator()
+    differentiator = Differentiator()
+
     def __init__(self, s):
-        self.lexer = Lexer()
-        self.tokenizer = Tokenizer()
-        self.converter = Converter()
-        self.evaluator = Evaluator()
+        self.source = s
+
+        self._compiled = None
+        self._derivative = None
+        self.memo = None
+
+        # FastLexer does lexing and tokenizing in one pass, so they are timed as one stage
+        sink = get_metrics_sink()
 
         try:
-            self.lexer_result = self.lexer.parse(s)
+            with timer(sink, 'wrapper.parse.seconds'):
+                self.tokenizer_result = self.lexer.parse(s)
+            self.lexer_result = self.tokenizer_result.lexer_result
             self.valid = True
         except LexerException as err:
             self.lexer_result = None
@@ -23,7 +52,6 @@ class EasyWrapper:
 
             return
 
-        self.tokenizer_result = self.tokenizer.tokenize(self.lexer_result)
         for item in self.tokenizer_result.result:
             if item[1] == Token.FUNCTION:
                 name = item[0].strip('-')
@@ -33,7 +61,152 @@ class EasyWrapper:
 
                     return
 
-        self.converter_result = self.converter.convert(self.tokenizer_result)
+        with timer(sink, 'wrapper.convert.seconds'):
+            converter_result = self.converter.convert(self.tokenizer_result)
+
+        with timer(sink, 'wrapper.optimize.seconds'):
+            self.converter_result = self.optimizer.optimize(converter_result)
+
+    @classmethod
+    def from_program(cls, program: Program, source: str = ''):
+        # skips the lexer, the converter and the optimizer, the program is expected to be optimized already
+        wrapper = cls.__new__(cls)
+        wrapper.source = source
+        wrapper._compiled = None
+        wrapper._derivative = None
+        wrapper.memo = None
+
+        wrapper.tokenizer_result = None
+        wrapper.lexer_result = LexerResult([], program.is_function)
+        wrapper.converter_result = ConverterResult.from_program(program)
+        wrapper.valid = True
+
+        return wrapper
+
+    @classmethod
+    def from_string(cls, s):
+        wrapper = cls.cache.get(s)
+
+        if wrapper is None:
+            wrapper = cls(s)
+            cls.cache.put(s, wrapper)
+
+        return wrapper
+
+    def memoize(self, maxsize: int = 1024, policy: str = POLICY_LRU):
+        # opt-in: a copy that remembers results per x, maxsize=0 gives a copy without it;
+        # from_string() hands the same wrapper to everyone, so it is never changed in place
+        wrapper = copy.copy(self)
+        wrapper.memo = BoundedCache(maxsize, policy) if maxsize else None
+
+        return wrapper
+
+    def derivative(self):
+        # d/dx as a wrapper of its own, built once, raises EvaluatorException for functions without a known derivative
+        if not self.valid:
+            raise self.err
+
+        if self._derivative is None:
+            converter_result = self.differentiator.differentiate(self.converter_result)
+            self._derivative = EasyWrapper.from_program(converter_result.program)
+
+        return self._derivative
+
+    def compile(self):
+        if self._compiled is None:
+            with timer(get_metrics_sink(), 'wrapper.compile.seconds'):
+                self._compiled = self.evaluator.compile(self.converter_result)
+
+        return self._compiled
 
     def __call__(self, x: float = 0):
-        return self.evaluator.eval(self.converter_result, x)
+        if type(x) is not float and is_array(x):
+            return self.evaluator.eval_array(self.converter_result, x)
+
+        if get_trace_hook() is not None:
+            # the compiled function has no hook calls, the interpreter traces every stack operation
+            return self.evaluator.eval(self.converter_result, x)
+
+        # numbers only (a 0-d array isn't hashable), NaN never finds itself, so it isn't remembered either
+        memo = self.memo
+        if memo is not None and isinstance(x, (float, int)) and x == x:
+            # -0.0 == 0.0, but 1/x tells them apart
+            key = float(x) if x else (0.0, math.copysign(1.0, x))
+
+            res = memo.get(key, memo)
+            if res is memo:
+                res = (self._compiled or self.compile())(x)
+                memo.put(key, res)
+
+            return res
+
+        return (self._compiled or self.compile())(x)
+
+    # __call__ isn't instrumented, it is too cheap for that, the solvers report how many times they called it
+    def eval_many(self, xs: Iterable[float]):
+        sink = get_metrics_sink()
+        if sink is None:
+            return self._eval_many(xs)
+
+        with timer(sink, 'wrapper.eval_many.seconds'):
+            res = self._eval_many(xs)
+
+        sink('wrapper.eval_many.evaluations', len(res))
+
+        return res
+
+    def _eval_many(self, xs: Iterable[float]):
+        # NaN instead of None, numpy array if numpy is available, array('d') otherwise
+        try:
+            np = numpy()
+        except ImportError:
+            compiled = self._compiled or self.compile()
+            res = array('d')
+
+            for x in xs:
+                # the compiled function returns None for division and domain errors, numpy gives NaN
+                # for overflows (10^400) and complex results ((-8)^(1/3)) as well
+                try:
+                    value = compiled(x)
+                except (OverflowError, TypeError):
+                    value = None
+
+                res.append(math.nan if value is None else value)
+
+            return res
+
+        return self.evaluator.eval_array(self.converter_result, _as_float_array(np, xs))
+
+
+def _as_float_array(np, xs: Iterable[float]):
+    if isinstance(xs, (np.ndarray, list, tuple, array)):
+        return np.asarray(xs, dtype=float)
+
+    return np.fromiter(xs, dtype=float)
+
+
+def evaluate_batch(expressions: Iterable[Union[str, EasyWrapper]], xs: Iterable[float]):
+    wrappers = []
+
+    for expression in expressions:
+        wrapper = EasyWrapper.from_string(expression) if isinstance(expression, str) else expression
+        if not wrapper.valid:
+            raise wrapper.err
+
+        wrappers.append(wrapper)
+
+    try:
+        np = numpy()
+    except ImportError:
+        xs = array('d', xs)
+
+        return [wrapper.eval_many(xs) for wrapper in wrappers]
+
+    # the grid is converted once and shared by all expressions, one row per expression
+    xs = _as_float_array(np, xs)
+    res = np.empty((len(wrappers), len(xs)))
+
+    for i, wrapper in enumerate(wrappers):
+        res[i] = wrapper.eval_many(xs)
+
+    return res
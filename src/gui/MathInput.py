@@ -1,13 +1,16 @@
 import string
 
 import PySide6
-from PySide6.QtCore import Qt, QEvent, Signal
+from PySide6.QtCore import Qt, QEvent, Signal, QTimer
 from PySide6.QtGui import QFont, QKeyEvent
 from PySide6.QtWidgets import QLineEdit, QWidget, QVBoxLayout, QLabel
 
-from src import EasyWrapper
+from src import EasyWrapper, IncrementalLexer, LexerException
 from src.evaluator.consts import OPERATORS, SYMBOL_DEGREE, SYMBOL_MINUS, SYMBOL_BRACKET_OPEN
 
+# pause in typing, ms, after which the expression is parsed completely and the window is notified
+DEBOUNCE_INTERVAL = 250
+
 
 class MathInput(QWidget):
     expressionChanged = Signal()
@@ -16,6 +19,17 @@ class MathInput(QWidget):
         super().__init__()
 
         self.valid = False
+        # the text self.valid is about, the line edit may already be ahead of it
+        self.expression = ''
+
+        # the syntax is checked on every key press, cheaply, as the text mostly grows at the end
+        self.lexer = IncrementalLexer()
+        self.committed = None
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_INTERVAL)
+        self.debounce_timer.timeout.connect(self.commit)
 
         layout = QVBoxLayout()
 
@@ -103,29 +117,45 @@ class MathInput(QWidget):
                                                                                                           16777223]:  # backspace, delete
                 return True
 
-            res = EasyWrapper(text)
+            try:
+                self.lexer.parse(text)
+                self.show_error(None, text)
+            except LexerException as err:
+                self.show_error(err, text)
 
-            if res.valid:
-                self.error_label.setText('')
-                self.error_pointer.setText('')
+            # restarted by every key press, so a burst of typing ends up as one evaluation
+            self.debounce_timer.start()
 
-                self.valid = True
+            return True
 
-                self.expressionChanged.emit()
-            else:
-                self.error_label.setText(str(res.err))
+        return super().eventFilter(watched, event)
 
-                self.valid = False
+    def commit(self):
+        text = self.line_edit.text()
 
-                if res.err.pos != -1:
-                    pointer = res.err.pos
-                    pointer -= 1
-                    self.error_pointer.setText(' ' * pointer + '↓' + ' ' * (len(text) - pointer - 2))
-                else:
-                    self.error_pointer.setText('')
+        res = EasyWrapper.from_string(text)
 
-                self.expressionChanged.emit()
+        # unknown functions are only found here, the lexer doesn't know about them
+        self.show_error(None if res.valid else res.err, text)
+        self.valid = res.valid
+        self.expression = text
 
-            return True
+        if self.committed != (text, self.valid):
+            self.committed = (text, self.valid)
+            self.expressionChanged.emit()
 
-        return super().eventFilter(watched, event)
+    def show_error(self, err, text: str):
+        if err is None:
+            self.error_label.setText('')
+            self.error_pointer.setText('')
+
+            return
+
+        self.error_label.setText(str(err))
+
+        if err.pos != -1:
+            pointer = err.pos
+            pointer -= 1
+            self.error_pointer.setText(' ' * pointer + '↓' + ' ' * (len(text) - pointer - 2))
+        else:
+            self.error_pointer.setText('')
@@ -1,15 +1,19 @@
 import sys
+from typing import Callable
 
-from PySide6.QtGui import Qt, QPaintEvent, QPainter
+from PySide6.QtCore import QThreadPool
+from PySide6.QtGui import Qt, QPaintEvent, QPainter, QCloseEvent
 from PySide6.QtWidgets import QGraphicsDropShadowEffect, QVBoxLayout, QWidget, QApplication, QLabel
 
 from .MathInput import MathInput
 from .OptionsWidget import OptionsWidget, EvaluatorOptions
+from .SolverWorker import SolverJob
 from .TitleBarWidget import TitleBarWidget
 from .colors import *
-from .. import EasyWrapper, solve_using_secant, integral_using_simpson
+from .. import EasyWrapper, CancellationToken, find_all_roots, integral_using_simpson_batched
 
 BORDER_RADIUS = 12
+MAX_ROOTS = 6
 
 
 class MathWindow(QWidget):
@@ -24,6 +28,11 @@ class MathWindow(QWidget):
 
         self.app = app
 
+        # solvers run in the pool, only the latest job may update the result
+        self.pool = QThreadPool(self)
+        self.job_id = 0
+        self.jobs = {}
+
         shadow_effect = QGraphicsDropShadowEffect(self)
         shadow_effect.setBlurRadius(24)
         shadow_effect.setOffset(0)
@@ -76,32 +85,90 @@ class MathWindow(QWidget):
             self.result.setText(f'{prefix} ∈ ∅')
 
     def solve_expression(self, wrapper: EasyWrapper):
-        res = solve_using_secant(wrapper, self.options.a, self.options.b)
+        a, b = self.options.a, self.options.b
 
-        if res is not None:
-            evaluated = wrapper(res)
+        def solve(progress: Callable, token: CancellationToken):
+            roots = find_all_roots(wrapper, a, b, token=token).value
+
+            # the value at a single root is shown too, so it's calculated in the worker as well
+            return roots, wrapper(roots[0]) if len(roots) == 1 else None
+
+        self.result.setText('x ≈ …')
+        self.start_job(solve, self.show_roots)
+
+    def show_roots(self, res):
+        roots, evaluated = res
+
+        if len(roots) == 1:
+            res = roots[0]
             self.result.setText(f'x ≈ {res:.2f}, ⨍({res:.2f}) ≈ {evaluated:.8f}')
+        elif roots:
+            s = ', '.join(f'{res:.2f}' for res in roots[:MAX_ROOTS])
+            if len(roots) > MAX_ROOTS:
+                s += ', …'
+
+            self.result.setText(f'x ∈ {{{s}}}')
         else:
             self.result.setText('x ∈ ∅')
 
     def integral_expression(self, wrapper: EasyWrapper):
-        def f(i, N):
-            self.result.setText(f'∫ step {i} / {N}')
-            self.app.processEvents()
+        a, b = self.options.a, self.options.b
+
+        def integrate(progress: Callable, token: CancellationToken):
+            return integral_using_simpson_batched(wrapper, a, b, progress, token).value
 
-        res = integral_using_simpson(wrapper, self.options.a, self.options.b, f)
+        self.result.setText('∫ ≈ …')
+        self.start_job(integrate, self.show_integral, self.show_integral_progress)
 
+    def show_integral_progress(self, i: int, N: int):
+        self.result.setText(f'∫ step {i} / {N}')
+
+    def show_integral(self, res):
         if res is not None:
             self.result.setText(f'∫ ≈ {res:.2f}')
         else:
             self.result.setText('∫ ∈ ∅')
 
+    def start_job(self, func: Callable, on_result: Callable, on_progress: Callable = None):
+        self.cancel_job()
+
+        self.job_id += 1
+        job = SolverJob(self.job_id, func)
+
+        # results of cancelled jobs may still be queued, so everything is filtered by the job id
+        job.signals.result.connect(lambda job_id, res: self.if_current(job_id, on_result, res))
+        job.signals.error.connect(lambda job_id, msg: self.if_current(job_id, self.result.setText, f'⚠ {msg}'))
+        if on_progress is not None:
+            job.signals.progress.connect(lambda job_id, i, n: self.if_current(job_id, on_progress, i, n))
+        job.signals.finished.connect(self.job_finished)
+
+        # the pool deletes the runnable itself, the reference keeps its signals alive until it's done
+        self.jobs[self.job_id] = job
+        self.pool.start(job)
+
+    def cancel_job(self):
+        job = self.jobs.get(self.job_id)
+        if job is not None:
+            job.cancel()
+
+        # anything still running is stale now
+        self.job_id += 1
+
+    def if_current(self, job_id: int, func: Callable, *args):
+        if job_id == self.job_id:
+            func(*args)
+
+    def job_finished(self, job_id: int):
+        self.jobs.pop(job_id, None)
+
     def expression_changed(self):
+        self.cancel_job()
         self.evaluate()
 
     def options_changed(self, options: EvaluatorOptions):
         self.options = options
 
+        self.cancel_job()
         self.evaluate()
 
     def evaluate(self):
@@ -109,7 +176,7 @@ class MathWindow(QWidget):
             self.result.setText('')
             return
 
-        wrapper = EasyWrapper(self.math_input.line_edit.text())
+        wrapper = EasyWrapper.from_string(self.math_input.expression)
 
         self.options_widget.setVisible(wrapper.lexer_result.is_function)
 
@@ -123,6 +190,13 @@ class MathWindow(QWidget):
             print('hto ya? dobavil noviy rezhim? ok, teper\' dobavlay handler v options_changed, debil...')
             sys.exit(-1)
 
+    def closeEvent(self, event: QCloseEvent) -> None:
+        # don't keep the application alive until a long integration is over
+        self.cancel_job()
+        self.pool.clear()
+
+        super().closeEvent(event)
+
     def paintEvent(self, event: QPaintEvent) -> None:
         # it's all about rounded corners...
         size = self.size()
@@ -0,0 +1,43 @@
+from typing import Callable
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from .. import CancellationToken
+
+
+class SolverSignals(QObject):
+    # every signal carries the job id, so the window can drop whatever comes from a stale job
+    progress = Signal(int, int, int)
+    result = Signal(int, object)
+    error = Signal(int, str)
+    finished = Signal(int)
+
+
+class SolverJob(QRunnable):
+    def __init__(self, job_id: int, func: Callable[[Callable, CancellationToken], object]):
+        super().__init__()
+
+        self.job_id = job_id
+        self.func = func
+        self.signals = SolverSignals()
+
+        # cancelled from the GUI thread, the solvers check it between their steps
+        self.token = CancellationToken()
+
+    def cancel(self):
+        self.token.cancel()
+
+    def run(self):
+        try:
+            res = self.func(self._progress, self.token)
+
+            if not self.token.cancelled:
+                self.signals.result.emit(self.job_id, res)
+        except Exception as err:
+            self.signals.error.emit(self.job_id, str(err))
+        finally:
+            self.signals.finished.emit(self.job_id)
+
+    def _progress(self, done: int, total: int):
+        if not self.token.cancelled:
+            self.signals.progress.emit(self.job_id, done, total)
@@ -1,7 +1,35 @@
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import logging
 import math
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
+from array import array
 
-from src import Lexer, Tokenizer, Token, Converter, Evaluator, LexerException, EvaluatorException, EasyWrapper
+from src.evaluator.cli import main as cli_main, Writer
+from src.evaluator.solvers import _find_all_roots_scalar
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src import Lexer, FastLexer, IncrementalLexer, Tokenizer, Token, Converter, Optimizer, Evaluator, LexerException, \
+    EvaluatorException, EasyWrapper, integral_using_simpson, integral_using_simpson_batched, \
+    integral_using_adaptive_simpson, integral_using_simpson_parallel, solve_using_secant, solve_using_brent, \
+    solve_using_newton, find_all_roots, LRUCache, BoundedCache, POLICY_FIFO, TraceRecorder, get_trace_hook, \
+    MetricsRecorder, get_metrics_sink, evaluate_batch, STATUS_CONVERGED, STATUS_EXHAUSTED, STATUS_FAILED, \
+    STATUS_CANCELLED, N, stream_eval, stream_text_file, stream_binary_file, write_text, write_binary, Program, \
+    ProgramLibrary, save_library, CancellationToken, async_integrate, async_solve, async_eval_many
 
 
 class TestLexer(unittest.TestCase):
@@ -138,6 +166,98 @@ class TestTokenizer(unittest.TestCase):
         self.assertEqual(str(lexer_res), str(res))
 
 
+class TestFastLexer(unittest.TestCase):
+    def setUp(self):
+        self.lexer = Lexer()
+        self.tokenizer = Tokenizer()
+        self.fast_lexer = FastLexer()
+
+    def run_both(self, exp: str):
+        res = []
+
+        for parse in [lambda: self.tokenizer.tokenize(self.lexer.parse(exp)), lambda: self.fast_lexer.parse(exp)]:
+            try:
+                tokens = parse()
+                res.append((tokens.result, tokens.lexer_result.result, tokens.lexer_result.is_function))
+            except LexerException as err:
+                res.append((err.pos, str(err)))
+
+        return res
+
+    def test_same_results(self):
+        for exp in ['1+2-3*4/58^6-(-x)^-97+(-1.1)', 'sin(x-2^-5)+log(-log(sin(f(x*x^2-9^(-9-x+sin(8))))))',
+                    '23942830428482304.93949394+99999999991,22^1338.228', ' 1 + - - 2 ', '-(1)', '--', 'exp(x)']:
+            first, second = self.run_both(exp)
+
+            self.assertEqual(first, second)
+
+    def test_same_errors(self):
+        for exp in ['1+3//4', '1+(-x))', '771.22^/2', '771(.22', '771.(22', '1+(771.22)(', 'x(', '1+sin)', '1.1.3+2',
+                    'cotan', '', '1+', '((1)', '1\t+2']:
+            first, second = self.run_both(exp)
+
+            self.assertEqual(first, second)
+
+    def test_fuzz(self):
+        rnd = random.Random(1337)
+        alphabet = '0123456789x+-*/^().,sinlogcotae_ '
+
+        # most of the random strings are invalid, don't flood the output with lexer errors
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        for _ in range(20000):
+            exp = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 12)))
+            if not exp.strip():
+                continue
+
+            first, second = self.run_both(exp)
+
+            self.assertEqual(first, second, exp)
+
+    def test_incremental(self):
+        rnd = random.Random(42)
+        alphabet = '0123456789x+-*/^().,sinlogcotae_ '
+        lexer = IncrementalLexer()
+
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        def parse(parser, exp):
+            try:
+                tokens = parser.parse(exp)
+                return tokens.result, tokens.lexer_result.result, tokens.lexer_result.is_function
+            except LexerException as err:
+                return err.pos, str(err)
+
+        text = ''
+        for _ in range(5000):
+            # mostly typing at the end, sometimes erasing or replacing everything
+            action = rnd.random()
+            if action < 0.8:
+                text += rnd.choice(alphabet)
+            elif action < 0.95:
+                text = text[:-1]
+            else:
+                text = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8)))
+
+            if text and not text.strip():
+                continue
+
+            self.assertEqual(parse(self.fast_lexer, text), parse(lexer, text), text)
+
+    def test_incremental_no_copies(self):
+        lexer = IncrementalLexer()
+        tokens = lexer.parse('1+si').result
+
+        # the trailing "si" is finished as a function, then continued as a part of "sin(x)"
+        self.assertRaises(LexerException, lexer.parse, '1+sin(x')
+        res = lexer.parse('1+sin(x)')
+
+        self.assertIs(tokens, res.result)
+        self.assertEqual(['1', '+', 'sin', '(', 'x', ')'], res.lexer_result.result)
+
+
 class TestConverter(unittest.TestCase):
     def setUp(self):
         self.lexer = Lexer()
@@ -176,6 +296,90 @@ class TestConverter(unittest.TestCase):
         self.assertEqual(str(lexer_res), str(res))
 
 
+class TestOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.lexer = Lexer()
+        self.tokenizer = Tokenizer()
+        self.converter = Converter()
+        self.optimizer = Optimizer()
+        self.evaluator = Evaluator()
+
+    def optimize(self, exp: str):
+        res = self.lexer.parse(exp)
+        res = self.tokenizer.tokenize(res)
+        res = self.converter.convert(res)
+        return res, self.optimizer.optimize(res)
+
+    def test_folding(self):
+        res, optimized = self.optimize('sin(8)*2^10+x')
+
+        self.assertEqual([str(math.sin(8) * 1024), 'x', '+'], [item[0] for item in optimized.result])
+        self.assertEqual(self.evaluator.eval(res, 3), self.evaluator.eval(optimized, 3))
+
+    def test_identities(self):
+        _, optimized = self.optimize('(x*1+0)^1/1-0+0*1+sin(x)^(2-1)')
+
+        self.assertEqual(['x', 'x', 'sin', '+'], [item[0] for item in optimized.result])
+
+    def test_errors_kept(self):
+        for exp in ['1/0+x', 'log(-1)*x']:
+            res, optimized = self.optimize(exp)
+
+            self.assertEqual(len(res.result), len(optimized.result))
+
+        _, optimized = self.optimize('(-8)^(1/3)+x')
+
+        self.assertEqual(['-8', str(1 / 3), '^', 'x', '+'], [item[0] for item in optimized.result])
+
+        _, optimized = self.optimize('x+1/(2-2)')
+
+        self.assertIsNone(self.evaluator.eval(optimized, 1))
+
+    def test_same_results(self):
+        exp = '1+x^2/7+log(-x-1)-(-2)^2*-sin(x)+cotan(2^0.5)*3-lg(100)'
+        res, optimized = self.optimize(exp)
+
+        self.assertLess(len(optimized.result), len(res.result))
+        for x in [-8, -3.5, -2, -1.1, 0]:
+            self.assertEqual(self.evaluator.eval(res, x), self.evaluator.eval(optimized, x))
+
+
+class TestDifferentiator(unittest.TestCase):
+    def derivative(self, exp: str):
+        return EasyWrapper(exp).derivative()
+
+    def test_simplified(self):
+        for exp, expected in [('x^2', '2.0 x *'), ('3*x+1', '3.0'), ('5', '0.0'), ('sin(x)*x', 'x cos x * x sin +'),
+                              ('-x', '-1.0')]:
+            self.assertEqual(expected, str(self.derivative(exp).converter_result))
+
+    def test_numeric(self):
+        h = 1e-6
+
+        for exp in ['x^x', '2^x', '1/x', 'cotan(x)', '-sin(x)^2', '-x^2', 'sqrt(x)', 'ln(x^2+1)', 'erf(x)',
+                    'exp(-x)', 'x/(x+1)', '-cos(2*x)', 'atan(x)/x', 'x^-2', 'lg(x)', 'lb(x)', 'tanh(x)', 'acos(x)',
+                    'cosin(x)*cbrt(x)']:
+            wrapper = EasyWrapper(exp)
+            derivative = wrapper.derivative()
+
+            for x in [0.3, 0.7]:
+                self.assertAlmostEqual((wrapper(x + h) - wrapper(x - h)) / (2 * h), derivative(x), 6, exp)
+
+    def test_second(self):
+        derivative = self.derivative('x^3-sin(x)').derivative()
+
+        self.assertAlmostEqual(6 * 2 + math.sin(2), derivative(2))
+
+    def test_unknown(self):
+        self.assertRaises(EvaluatorException, self.derivative, 'gamma(x)')
+        self.assertRaises(LexerException, self.derivative, 'x+')
+
+    def test_cached(self):
+        wrapper = EasyWrapper('x^2')
+
+        self.assertIs(wrapper.derivative(), wrapper.derivative())
+
+
 class TestEvaluator(unittest.TestCase):
     def setUp(self):
         self.lexer = Lexer()
@@ -238,6 +442,58 @@ class TestEvaluator(unittest.TestCase):
         with self.assertRaises(EvaluatorException):
             _ = self.evaluator.eval(res)
 
+    def compile(self, exp: str):
+        res = self.lexer.parse(exp)
+        res = self.tokenizer.tokenize(res)
+        res = self.converter.convert(res)
+        return res, self.evaluator.compile(res)
+
+    def test_compile(self):
+        exp = '1+x^2/7+log(-x-1)-(-2)^2*-sin(x)+cotan(x)'
+        res, func = self.compile(exp)
+
+        for x in [-8, -3.5, -2, -1.1]:
+            self.assertAlmostEqual(self.evaluator.eval(res, x), func(x))
+
+    def test_compile_errors(self):
+        _, func = self.compile('1/x+log(x)')
+
+        self.assertIsNone(func(0))
+        self.assertIsNone(func(-1))
+
+    def test_compile_deep(self):
+        exp = '+'.join(['x'] * 1000)
+        _, func = self.compile(exp)
+
+        self.assertEqual(2000, func(2))
+
+    def test_compile_throws(self):
+        with self.assertRaises(EvaluatorException):
+            _ = self.compile('1/smth(-3)')
+
+    def test_program(self):
+        res = self.converter.convert(self.tokenizer.tokenize(self.lexer.parse('2*x+2*-sin(x)-0+-0')))
+
+        self.assertIs(res.program, res.program)
+        self.assertEqual('Program(2.0 x * 2.0 x -sin * + 0.0 - -0.0 +)', repr(res.program))
+        self.assertEqual(3, len(res.program.constants))
+        self.assertEqual(('sin',), res.program.names)
+
+    def test_program_matches_tokens(self):
+        exps = ['1+x^2/7+log(-x-1)-(-2)^2*-sin(x)+cotan(x)', '-x^3-x/2', 'floor(x)*2^-x', '1/(x-1)', 'sqrt(x)']
+
+        for exp in exps:
+            res = self.converter.convert(self.tokenizer.tokenize(self.lexer.parse(exp)))
+
+            for x in [-2.5, -1, 0, 1, 3.5]:
+                expected = None
+                try:
+                    expected = float(self.evaluator._eval(res.result, x))
+                except (ZeroDivisionError, ValueError):
+                    pass
+
+                self.assertEqual(expected, self.evaluator.eval(res, x), (exp, x))
+
 
 class TestWrapper(unittest.TestCase):
     def get_result(self, exp: str, x: float = 0):
@@ -248,3 +504,716 @@ class TestWrapper(unittest.TestCase):
         res = self.get_result(exp, 1)
 
         self.assertEqual(0, res)
+
+    def test_compiled(self):
+        wrapper = EasyWrapper('x^2-sin(x)')
+
+        self.assertIs(wrapper.compile(), wrapper.compile())
+        self.assertAlmostEqual(4 - math.sin(2), wrapper(2))
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array(self):
+        wrapper = EasyWrapper('1/x+log(x)-sqrt(x)*cotan(x)^2+lg(x)+erf(x)')
+        xs = np.array([-1, 0, 0.5, 2, 10])
+
+        res = wrapper(xs)
+
+        for x, value in zip(xs, res):
+            expected = wrapper(float(x))
+
+            if expected is None:
+                self.assertTrue(math.isnan(value))
+            else:
+                self.assertAlmostEqual(expected, value)
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array_errors(self):
+        # the failed steps are NaN, which NaN^0, 1^NaN and isnan must not turn back into numbers
+        xs = np.array([0.0, 1.0, 2.0])
+
+        for exp in ['0^-1^x^x*x+1,5', 'ln(-x/-x)^sin(x*1,5)-1', 'isnan(ln(x-1))', '1^ln(x-1)', 'isinf(1/x)']:
+            wrapper = EasyWrapper(exp)
+            res = wrapper(xs)
+
+            for x, value in zip(xs, res):
+                expected = wrapper(float(x))
+
+                if expected is None:
+                    self.assertTrue(math.isnan(value), (exp, x))
+                else:
+                    self.assertAlmostEqual(expected, value, msg=(exp, x))
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array_constant(self):
+        res = EasyWrapper('2^10-1/0')(np.arange(3.0))
+
+        self.assertEqual((3,), res.shape)
+        self.assertTrue(np.isnan(res).all())
+
+    def test_from_string(self):
+        EasyWrapper.cache.clear()
+
+        wrapper = EasyWrapper.from_string('x^2-1')
+
+        self.assertIs(wrapper, EasyWrapper.from_string('x^2-1'))
+        self.assertEqual((1, 1), EasyWrapper.cache.info()[:2])
+
+        self.assertTrue(EasyWrapper.cache.invalidate('x^2-1'))
+        self.assertIsNot(wrapper, EasyWrapper.from_string('x^2-1'))
+
+    def test_from_string_invalid(self):
+        wrapper = EasyWrapper.from_string('1+')
+
+        self.assertFalse(wrapper.valid)
+        self.assertIs(wrapper, EasyWrapper.from_string('1+'))
+
+    def test_memoize(self):
+        wrapper = EasyWrapper('x^2-1').memoize(2)
+
+        self.assertEqual(3, wrapper(2))
+        self.assertEqual(3, wrapper(2))
+        self.assertIsNone(EasyWrapper('1/x').memoize()(0))
+        self.assertEqual((1, 1, 2, 1), tuple(wrapper.memo.info()))
+
+        self.assertIsNone(wrapper.memoize(0).memo)
+        self.assertIsNotNone(wrapper.memo)
+
+    def test_memoize_copy(self):
+        shared = EasyWrapper.from_string('x^3')
+        memoized = shared.memoize()
+
+        self.assertIsNot(shared, memoized)
+        self.assertIsNone(shared.memo)
+        self.assertIs(shared, EasyWrapper.from_string('x^3'))
+
+    def test_memoize_keys(self):
+        wrapper = EasyWrapper('x*3').memoize()
+
+        self.assertEqual(1.5, wrapper(0.5))
+        self.assertEqual(1.0, math.copysign(1, wrapper(0.0)))
+        self.assertEqual(-1.0, math.copysign(1, wrapper(-0.0)))
+        self.assertTrue(math.isnan(wrapper(math.nan)))
+        self.assertEqual(3, len(wrapper.memo))
+
+        if np is not None:
+            self.assertEqual(0.75, wrapper(np.array(0.25)))
+
+    def test_eval_many(self):
+        res = EasyWrapper('1/x-1').eval_many(x / 2 for x in range(-2, 3))
+
+        self.assertEqual(5, len(res))
+        self.assertTrue(math.isnan(res[2]))
+        self.assertEqual([-2, -3, 1, 0], [res[0], res[1], res[3], res[4]])
+
+    def test_eval_many_errors(self):
+        # overflows and complex results are NaN with numpy and without it
+        code = 'import sys; sys.modules["numpy"] = None; from src import EasyWrapper; ' \
+               'print(*EasyWrapper("10^x").eval_many([1, 400]), *EasyWrapper("(-8)^x").eval_many([1, 0.5]))'
+        out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+
+        self.assertEqual('10.0 nan -8.0 nan', out.strip())
+
+        res = list(EasyWrapper('10^x').eval_many([1, 400])) + list(EasyWrapper('(-8)^x').eval_many([1, 0.5]))
+
+        self.assertEqual([10, -8], [res[0], res[2]])
+        self.assertTrue(math.isnan(res[1]) and math.isnan(res[3]))
+
+    def test_evaluate_batch(self):
+        xs = [0, 1, 2]
+        res = evaluate_batch(['x^2', EasyWrapper('2*x'), 'log(x)'], xs)
+
+        self.assertEqual([0, 1, 4], list(res[0]))
+        self.assertEqual([0, 2, 4], list(res[1]))
+        self.assertTrue(math.isnan(res[2][0]))
+        self.assertAlmostEqual(math.log(2), res[2][2])
+
+        with self.assertRaises(LexerException):
+            evaluate_batch(['x+'], xs)
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = EasyWrapper('1/x')
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_stream_eval(self):
+        res = list(stream_eval(self.wrapper, iter(range(5)), 2))
+
+        self.assertEqual([2, 2, 1], [len(chunk) for chunk in res])
+        self.assertEqual([1, 0.5, 1 / 3, 0.25], [value for chunk in res for value in chunk][1:])
+
+    def test_text_file(self):
+        path = os.path.join(self.dir.name, 'xs.csv')
+        with open(path, 'w') as file:
+            file.write('a,1\nb,2\n\nc,0\n')
+
+        out = io.StringIO()
+        count = write_text(stream_text_file(self.wrapper, path, 2, column=1), out)
+
+        self.assertEqual(3, count)
+        self.assertEqual('1.0\n0.5\nnan\n', out.getvalue())
+
+    def test_binary_file(self):
+        path = os.path.join(self.dir.name, 'xs.bin')
+        with open(path, 'wb') as file:
+            array('d', [0, 1, 2, 4, 8]).tofile(file)
+
+        out = io.BytesIO()
+        count = write_binary(stream_binary_file(self.wrapper, path, 2), out)
+
+        res = array('d', out.getvalue())
+
+        self.assertEqual(5, count)
+        self.assertTrue(math.isnan(res[0]))
+        self.assertEqual([1, 0.5, 0.25, 0.125], list(res[1:]))
+
+    def test_binary_file_size(self):
+        path = os.path.join(self.dir.name, 'xs.bin')
+        with open(path, 'wb') as file:
+            file.write(b'123')
+
+        with self.assertRaises(ValueError):
+            list(stream_binary_file(self.wrapper, path))
+
+
+class TestProgramFormat(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_bytes(self):
+        wrapper = EasyWrapper('cotan(x)*-sin(x)+2^-x/3')
+        program = wrapper.converter_result.program
+
+        for loaded in (Program.from_bytes(program.to_bytes()), pickle.loads(pickle.dumps(program))):
+            self.assertEqual(repr(program), repr(loaded))
+
+            loaded_wrapper = EasyWrapper.from_program(loaded)
+            for x in [-1.5, 0.5, 2]:
+                self.assertEqual(wrapper(x), loaded_wrapper(x))
+
+    def test_bad_bytes(self):
+        data = EasyWrapper('x+1').converter_result.program.to_bytes()
+
+        for bad in (b'', b'nope' + data[4:], data[:4] + bytes([99]) + data[5:], data[:-4]):
+            with self.assertRaises(ValueError):
+                Program.from_bytes(bad)
+
+        # an operator without operands
+        with self.assertRaises(ValueError):
+            Program.from_bytes(data[:16] + bytes([3, 1, 3]) + data[19:])
+
+    def test_library(self):
+        path = os.path.join(self.dir.name, 'formulas.bin')
+        self.assertEqual(2, save_library(path, ['x^2-1', EasyWrapper('sqrt(x)')]))
+
+        EasyWrapper.cache.clear()
+
+        with ProgramLibrary(path) as library:
+            self.assertEqual(['x^2-1', 'sqrt(x)'], list(library))
+
+            program = library.get_program('sqrt(x)')
+            self.assertIs(program, library.get_program('sqrt(x)'))
+            self.assertEqual(3, EasyWrapper.from_program(program)(9))
+
+            self.assertEqual(8, library.get_wrapper('x^2-1')(3))
+            self.assertIs(library.get_wrapper('x^2-1'), library.get_wrapper('x^2-1'))
+            self.assertEqual(5, library.get_wrapper('x+2')(3))
+
+            # the shared cache still parses the source
+            self.assertIsNotNone(EasyWrapper.from_string('x^2-1').tokenizer_result)
+
+    def test_cli(self):
+        path = os.path.join(self.dir.name, 'formulas.bin')
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(0, cli_main(['compile', 'x^3', '-o', path]))
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cli_main(['eval', 'x^3', '-x', '2', '-l', path])
+
+        self.assertEqual(8, json.loads(out.getvalue())[0]['value'])
+
+
+class TestCli(unittest.TestCase):
+    def run_cli(self, *argv):
+        out = io.StringIO()
+
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(0, cli_main(list(argv)))
+
+        return out.getvalue()
+
+    def test_eval(self):
+        res = json.loads(self.run_cli('eval', 'x^2', '1/x', 'x+', '-x', '0', '-x', '2'))
+
+        self.assertEqual([0, 4, None, 0.5], [item['value'] for item in res[:4]])
+        self.assertIn('error', res[4])
+
+    def test_evaluation_errors(self):
+        res = json.loads(self.run_cli('eval', '10^400', '(-8)^(1/3)', '1+1'))
+
+        self.assertEqual([None, None, 2], [item['value'] for item in res])
+        self.assertIn('error', res[0])
+        self.assertIn('error', res[1])
+
+    def test_blank_expressions(self):
+        res = json.loads(self.run_cli('eval', ' ', '', '1+1'))
+
+        self.assertEqual([2], [item['value'] for item in res])
+
+    def test_non_finite(self):
+        out = io.StringIO()
+        writer = Writer('integrate', 'json', out)
+        writer.write([{'expression': '1/x', 'value': math.nan, 'error': math.inf}])
+        writer.close()
+
+        self.assertEqual([{'expression': '1/x', 'value': None, 'error': None}], json.loads(out.getvalue()))
+
+    def test_logging_untouched(self):
+        self.run_cli('eval', 'x')
+
+        self.assertFalse(logging.getLogger('other').manager.disable)
+        self.assertEqual(logging.NOTSET, logging.getLogger('Evaluator').level)
+
+    def test_root_csv(self):
+        res = self.run_cli('root', 'x^2-2', '-a', '0', '-b', '3', '--method', 'brent', '--format', 'csv')
+        lines = res.splitlines()
+
+        self.assertEqual('expression,root,error', lines[0])
+        self.assertAlmostEqual(math.sqrt(2), float(lines[1].split(',')[1]))
+
+    def test_file_and_jobs(self):
+        with tempfile.TemporaryDirectory() as dir_name:
+            path = os.path.join(dir_name, 'expressions.txt')
+            with open(path, 'w') as file:
+                file.write('x\n# comment\n\n2*x\nx^2\n')
+
+            res = json.loads(self.run_cli('integrate', '-f', path, '-a', '0', '-b', '1', '-j', '2'))
+
+        self.assertEqual(['x', '2*x', 'x^2'], [item['expression'] for item in res])
+        for item, expected in zip(res, [0.5, 1, 1 / 3]):
+            self.assertAlmostEqual(expected, item['value'])
+
+    def test_timeout(self):
+        res = json.loads(self.run_cli('integrate', 'x', '-a', '0', '-b', '1', '-t', '0'))
+
+        self.assertEqual('timed out', res[0]['error'])
+
+
+class TestAsync(unittest.TestCase):
+    def test_integrate(self):
+        wrapper = EasyWrapper('sin(x)*x')
+        steps = []
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        async def main():
+            task = asyncio.create_task(ticker())
+            res = await async_integrate(wrapper, -2, 5, lambda i, n: steps.append(i), chunk=5000)
+            task.cancel()
+
+            return res
+
+        res = asyncio.run(main())
+
+        self.assertEqual(STATUS_CONVERGED, res.status)
+        self.assertAlmostEqual(integral_using_simpson(wrapper, -2, 5).value, res.value, places=8)
+        self.assertEqual([0, 5000, 10000, 15000, 20000], steps)
+        # the loop kept running between the chunks
+        self.assertGreater(len(ticks), 1)
+
+    def test_integrate_cancelled(self):
+        token = CancellationToken()
+        token.cancel()
+
+        res = asyncio.run(async_integrate(EasyWrapper('x'), 0, 1, token=token))
+
+        self.assertEqual(STATUS_CANCELLED, res.status)
+        self.assertEqual(0, res.evaluations)
+
+    def test_solve(self):
+        res = asyncio.run(async_solve(EasyWrapper('x^2-2'), 0, 3))
+
+        self.assertEqual(STATUS_CONVERGED, res.status)
+        self.assertAlmostEqual(math.sqrt(2), res.value, 4)
+
+    def test_solve_task_cancelled(self):
+        token = CancellationToken()
+
+        def endless(expr, a, b, token):
+            while not token.cancelled:
+                pass
+
+        async def main():
+            task = asyncio.create_task(async_solve(EasyWrapper('x'), 0, 1, endless, token))
+            await asyncio.sleep(0.01)
+            task.cancel()
+
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(asyncio.wait_for(main(), 5))
+
+        self.assertTrue(token.cancelled)
+
+    def test_backpressure(self):
+        running = []
+        peak = []
+
+        def solver(expr, a, b, token):
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.01)
+            running.pop()
+
+        async def main():
+            semaphore = asyncio.Semaphore(2)
+            await asyncio.gather(*(async_solve(EasyWrapper('x'), 0, 1, solver, semaphore=semaphore)
+                                   for _ in range(6)))
+
+        asyncio.run(main())
+
+        self.assertEqual(6, len(peak))
+        self.assertLessEqual(max(peak), 2)
+
+    def test_eval_many(self):
+        wrapper = EasyWrapper('1/x')
+        xs = [-2, -1, 0, 1, 2, 3, 4]
+
+        res = asyncio.run(async_eval_many(wrapper, xs, chunk=3))
+
+        self.assertEqual([-0.5, -1, 1, 0.5, 1 / 3, 0.25], [res[i] for i in (0, 1, 3, 4, 5, 6)])
+        self.assertTrue(math.isnan(res[2]))
+        self.assertEqual(0, len(asyncio.run(async_eval_many(wrapper, []))))
+
+
+class TestImports(unittest.TestCase):
+    def test_cold_start(self):
+        code = 'import sys, src.evaluator as e; print(e.FUNCTIONS._table is None, ' \
+               '*(m in sys.modules for m in ("PySide6", "multiprocessing", "asyncio")))'
+        out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+
+        self.assertEqual('True False False False', out.strip())
+
+    def test_functions(self):
+        from src.evaluator.consts import FUNCTIONS
+
+        self.assertIs(math.sin, FUNCTIONS['sin'])
+        self.assertIs(math.log10, FUNCTIONS.get('lg'))
+        self.assertAlmostEqual(1 / math.tan(1), FUNCTIONS['cotan'](1))
+        self.assertIn('cosh', FUNCTIONS)
+        self.assertNotIn('pi', FUNCTIONS)
+
+
+class TestTracing(unittest.TestCase):
+    def test_recorder(self):
+        lexer = Lexer()
+        tokenizer = Tokenizer()
+        converter = Converter()
+        evaluator = Evaluator()
+
+        with TraceRecorder() as recorder:
+            res = converter.convert(tokenizer.tokenize(lexer.parse('1+sin(x)')))
+            evaluator.eval(res, 2)
+
+        self.assertIsNone(get_trace_hook())
+
+        transitions = [(data['source'], data['target']) for stage, event, data in recorder.events
+                       if event == 'transition']
+        self.assertEqual([('S', 'I'), ('I', 'S'), ('S', 'F'), ('F', 'F'), ('F', 'F'), ('F', 'S'), ('S', 'X'),
+                          ('X', 'B')], transitions)
+
+        stages = {stage for stage, _, _ in recorder.events}
+        self.assertEqual({'Lexer', 'Tokenizer', 'Converter', 'Evaluator'}, stages)
+
+        pushes = [data['value'] for stage, event, data in recorder.events if stage == 'Evaluator']
+        self.assertEqual(['1', 2, math.sin(2), 1 + math.sin(2)], pushes)
+
+    def test_wrapper(self):
+        with TraceRecorder() as recorder:
+            res = EasyWrapper('x^2+sin(x)')(1.0)
+
+        self.assertEqual(1 + math.sin(1), res)
+
+        stages = {stage for stage, _, _ in recorder.events}
+        self.assertEqual({'Lexer', 'Converter', 'Evaluator'}, stages)
+
+        pushes = [data['value'] for stage, event, data in recorder.events if stage == 'Evaluator']
+        self.assertEqual([1.0, '2', 1.0, 1.0, math.sin(1), 1 + math.sin(1)], pushes)
+
+    def test_fast_lexer_transitions(self):
+        for exp in ['1+sin(x)', '-(x^2)*3.5 - cotan(-x)', '(1,5)']:
+            with TraceRecorder(['Lexer']) as slow:
+                Lexer().parse(exp)
+            with TraceRecorder(['Lexer']) as fast:
+                FastLexer().parse(exp)
+
+            transitions = [event for event in slow.events if event[1] == 'transition']
+            self.assertEqual(transitions, fast.events, exp)
+
+    def test_stages(self):
+        with TraceRecorder(['Tokenizer']) as recorder:
+            Tokenizer().tokenize(Lexer().parse('x-1'))
+
+        self.assertEqual([('x', 'VARIABLE'), ('-', 'OPERATOR'), ('1', 'INTEGER')],
+                         [(data['lexeme'], data['token']) for _, _, data in recorder.events])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_wrapper(self):
+        with MetricsRecorder() as recorder:
+            wrapper = EasyWrapper('sin(x)*2+1')
+            wrapper.eval_many([0, 1, 2])
+
+        self.assertIsNone(get_metrics_sink())
+
+        for stage in ('parse', 'convert', 'optimize', 'eval_many'):
+            self.assertEqual(1, recorder.counts[f'wrapper.{stage}.seconds'])
+            self.assertGreater(recorder.totals[f'wrapper.{stage}.seconds'], 0)
+
+        self.assertEqual(3, recorder.totals['wrapper.eval_many.evaluations'])
+
+    def test_solvers(self):
+        wrapper = EasyWrapper('x^2-2')
+
+        with MetricsRecorder() as recorder:
+            root = solve_using_secant(wrapper, 0, 3)
+            integral_using_simpson(wrapper, 0, 1)
+
+        self.assertAlmostEqual(math.sqrt(2), root.value, 4)
+        self.assertEqual(recorder.totals['secant.iterations'] + 2, recorder.totals['secant.evaluations'])
+        self.assertEqual(3 * N, recorder.totals['simpson.evaluations'])
+        self.assertEqual(N, recorder.totals['simpson.iterations'])
+        self.assertIn('simpson.seconds', recorder.summary())
+
+
+class TestCache(unittest.TestCase):
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        self.assertEqual(1, cache.get('a'))
+
+        cache.put('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual((2, 1, 2, 2), tuple(cache.info()))
+
+    def test_fifo(self):
+        cache = BoundedCache(2, POLICY_FIFO)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        self.assertEqual(1, cache.get('a'))
+
+        cache.put('c', 3)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.clear()
+
+        self.assertEqual(0, len(cache))
+        self.assertNotIn('a', cache)
+
+
+class TestSolvers(unittest.TestCase):
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_simpson_batched(self):
+        for exp, a, b in [('x^2', 0, 3), ('sin(x)*x', -2, 5), ('sqrt(x)', -1, 4)]:
+            wrapper = EasyWrapper(exp)
+            steps = []
+
+            res = integral_using_simpson_batched(wrapper, a, b, lambda i, n: steps.append(i))
+
+            self.assertAlmostEqual(integral_using_simpson(wrapper, a, b).value, res.value, places=8)
+            self.assertEqual([0, 10000, 20000], steps)
+
+    def test_adaptive_simpson(self):
+        sin_x_x = math.sin(5) - 5 * math.cos(5) - 2 * math.cos(2) + math.sin(2)
+
+        for exp, a, b, expected in [('x', 0, 3, 4.5), ('sin(x)*x', -2, 5, sin_x_x), ('sqrt(x)', -1, 4, 16 / 3),
+                                    ('x^2', 3, 0, -9)]:
+            res = integral_using_adaptive_simpson(EasyWrapper(exp), a, b)
+
+            self.assertEqual(STATUS_CONVERGED, res.status)
+            self.assertAlmostEqual(expected, res.value, places=6)
+            self.assertLess(res.evaluations, 1000)
+
+    def test_adaptive_simpson_budget(self):
+        res = integral_using_adaptive_simpson(EasyWrapper('sin(1/x)'), 0.001, 1, max_evaluations=100)
+
+        self.assertEqual(STATUS_EXHAUSTED, res.status)
+        self.assertLessEqual(res.evaluations, 100)
+        self.assertGreater(res.error, 0)
+
+    def test_simpson_parallel(self):
+        wrapper = EasyWrapper('sin(x)*x')
+        steps = []
+
+        res = integral_using_simpson_parallel(wrapper, -2, 5, lambda i, n: steps.append(i), jobs=2)
+
+        self.assertAlmostEqual(integral_using_simpson(wrapper, -2, 5).value, res.value, places=8)
+        self.assertEqual(res.value, integral_using_simpson_parallel(wrapper.source, -2, 5, jobs=1).value)
+        self.assertEqual(25000, steps[-1])
+
+    def test_simpson_parallel_program(self):
+        wrapper = EasyWrapper('sin(x)*x')
+        res = integral_using_simpson_parallel(EasyWrapper.from_program(wrapper.converter_result.program), -2, 5, jobs=1)
+
+        self.assertEqual(integral_using_simpson_parallel(wrapper, -2, 5, jobs=1).value, res.value)
+
+        for expr in ['x+', EasyWrapper('x+')]:
+            self.assertRaises(LexerException, integral_using_simpson_parallel, expr, -2, 5, jobs=1)
+
+    def test_brent(self):
+        for exp, a, b, expected in [('x^2-2', 0, 3, math.sqrt(2)), ('sin(x)', 3, 4, math.pi), ('x-1', 1, 3, 1),
+                                    ('exp(x)-1000', 0, 100, math.log(1000))]:
+            res = solve_using_brent(EasyWrapper(exp), a, b)
+
+            self.assertEqual(STATUS_CONVERGED, res.status)
+            self.assertAlmostEqual(expected, res.value, places=10)
+            self.assertLessEqual(res.evaluations, res.iterations + 2)
+
+    def test_brent_no_bracket(self):
+        res = solve_using_brent(EasyWrapper('x^2+1'), -1, 1)
+
+        self.assertIsNone(res.value)
+        self.assertEqual(STATUS_FAILED, res.status)
+
+    def test_brent_budget(self):
+        res = solve_using_brent(EasyWrapper('x^3-x-2'), -100, 100, max_steps=3)
+
+        self.assertEqual(STATUS_EXHAUSTED, res.status)
+        self.assertEqual(5, res.evaluations)
+
+    def test_newton(self):
+        for exp, a, b, expected in [('x^2-2', 0, 3, math.sqrt(2)), ('sin(x)', 3, 4, math.pi),
+                                    ('cos(x)-x', 0, 1, 0.7390851332), ('exp(x)-1000', 0, 100, math.log(1000))]:
+            wrapper = EasyWrapper(exp)
+            newton = solve_using_newton(wrapper, a, b)
+            halley = solve_using_newton(wrapper, a, b, halley=True)
+
+            for res in newton, halley:
+                self.assertEqual(STATUS_CONVERGED, res.status)
+                self.assertAlmostEqual(expected, res.value, places=6)
+
+            self.assertLessEqual(halley.iterations, newton.iterations)
+
+    def test_newton_failed(self):
+        self.assertEqual(STATUS_FAILED, solve_using_newton(EasyWrapper('x^2+1'), 0, 3).status)
+        self.assertEqual(STATUS_FAILED, solve_using_newton(EasyWrapper('gamma(x)-2'), 1, 4).status)
+
+        token = CancellationToken()
+        token.cancel()
+
+        self.assertEqual(STATUS_CANCELLED, solve_using_newton(EasyWrapper('x^2-2'), 0, 3, token=token).status)
+
+    def test_newton_pole(self):
+        # the bracket collapses onto the sign change of a pole, which is no root
+        for exp, a, b in [('1/x', -1, 2), ('tan(x)', 1, 2)]:
+            self.assertEqual(STATUS_FAILED, solve_using_newton(EasyWrapper(exp), a, b).status, exp)
+
+    # the batched search, and the one used without numpy
+    ROOT_FINDERS = [find_all_roots, functools.partial(_find_all_roots_scalar, samples=1000, xtol=1e-12, ftol=1e-4,
+                                                      max_steps=100)]
+
+    def test_find_all_roots(self):
+        for finder in self.ROOT_FINDERS:
+            res = finder(EasyWrapper('sin(x)'), -10, 10)
+
+            self.assertEqual(7, len(res.value))
+            for root, k in zip(res.value, range(-3, 4)):
+                self.assertAlmostEqual(k * math.pi, root, places=10)
+
+    def test_find_all_roots_reversed(self):
+        for finder in self.ROOT_FINDERS:
+            res = finder(EasyWrapper('sin(x)'), 4, -4)
+
+            self.assertEqual(3, len(res.value))
+            for root, k in zip(res.value, range(-1, 2)):
+                self.assertAlmostEqual(k * math.pi, root, places=12)
+
+            res = finder(EasyWrapper('(x-0.1234)^2'), 1, -1)
+
+            self.assertEqual(1, len(res.value))
+            self.assertAlmostEqual(0.1234, res.value[0], places=6)
+
+    def test_find_all_roots_zero_runs(self):
+        for finder in self.ROOT_FINDERS:
+            self.assertEqual([-1], finder(EasyWrapper('x-x'), -1, 1).value)
+
+            # 0 starts the run of zeros on [0, 3], -2 is an ordinary root
+            res = finder(EasyWrapper('(fabs(x)-x)*(x+2)'), -3, 3)
+
+            self.assertEqual(2, len(res.value))
+            self.assertAlmostEqual(-2, res.value[0], places=10)
+            self.assertEqual(0, res.value[1])
+
+    def test_find_all_roots_multiple(self):
+        for finder in self.ROOT_FINDERS:
+            res = finder(EasyWrapper('(x-1)^2*(x+2)'), -3, 3)
+
+            self.assertEqual(2, len(res.value))
+            self.assertAlmostEqual(-2, res.value[0], places=10)
+            self.assertAlmostEqual(1, res.value[1], places=4)
+
+    def test_find_all_roots_poles(self):
+        for finder in self.ROOT_FINDERS:
+            self.assertEqual([], finder(EasyWrapper('1/(x-0.1234)'), -1, 1).value)
+            self.assertEqual(1, len(finder(EasyWrapper('tan(x)'), -3, 3).value))
+
+    def test_cancellation_token(self):
+        token = CancellationToken()
+        self.assertFalse(token.cancelled)
+        self.assertIsNone(token.remaining())
+
+        token.cancel()
+        self.assertTrue(token.cancelled)
+        self.assertFalse(token.expired)
+
+        token = CancellationToken(timeout=0)
+        self.assertTrue(token.cancelled)
+        self.assertTrue(token.expired)
+        self.assertEqual(0, token.remaining())
+
+        self.assertGreater(CancellationToken(timeout=60).remaining(), 0)
+
+    def test_cancelled_solvers(self):
+        # simpson is exact for polynomials, so the adaptive one would be done before its first check
+        wrapper = EasyWrapper('sqrt(x)-1')
+
+        for solver in [solve_using_secant, solve_using_brent, find_all_roots, integral_using_simpson,
+                       integral_using_adaptive_simpson, integral_using_simpson_parallel]:
+            token = CancellationToken()
+            token.cancel()
+
+            res = solver(wrapper, 0, 3, token=token)
+
+            self.assertEqual(STATUS_CANCELLED, res.status, solver.__name__)
+            self.assertIsNotNone(res.value, solver.__name__)
+
+    def test_simpson_deadline(self):
+        steps = []
+
+        res = integral_using_simpson(EasyWrapper('x'), 0, 1, lambda i, n: steps.append(i),
+                                     token=CancellationToken(timeout=0))
+
+        self.assertEqual(STATUS_CANCELLED, res.status)
+        self.assertLess(res.iterations, N)
+        self.assertEqual([0], steps)